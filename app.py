@@ -2,13 +2,17 @@ import streamlit as st
 import pandas as pd
 import datetime
 import pytz
-import plotly.express as px
-import time
 import random
 
 from lib import init_nav, warm_cache, init_connection
 from chart import render_stock_history
-from data import get_stock_min, get_trades_second, get_realtime_second
+from data import get_stock_min, get_trades_second
+from poller import get_poller, session_id
+from downsample import points_for_width
+from livechart import live_price
+from refresh import MODES, default_mode, view_interval
+from scheduler import keep_live, live_interval
+from tracing import begin, end, fragment_run, span
 
 title = "A Real-Time Analytics Platform"
 
@@ -19,6 +23,9 @@ st.set_page_config(
 
 init_nav()
 
+# The run's spans (data.py, chart.py and the sections below) form a timeline; add ?trace=1 to the URL to see it
+begin("app")
+
 st.markdown(
     f"""
     # {title}
@@ -68,12 +75,16 @@ if st.button("Random ticker and day range"):
 
 nytz = pytz.timezone("America/New_York")
 
+# The centered layout leaves roughly this many pixels for a chart; the bar period is picked to fit it
+chart_points = points_for_width(700)
+
 now = nytz.localize(datetime.datetime.now())
 dff = get_stock_min(
-    [selectedTicker], now - datetime.timedelta(days=numDays), now, "Day"
+    [selectedTicker], now - datetime.timedelta(days=numDays), now, "Auto", chart_points
 )
-fig = render_stock_history(selectedTicker, "Day", dff, "")
-st.plotly_chart(fig)
+fig = render_stock_history(selectedTicker, dff.attrs["aggregation_period"], dff, "", chart_points)
+with span("st.plotly_chart"):
+    st.plotly_chart(fig)
 st.caption(
     f"Trading within the last {numDays} days for {selectedTicker}, aggregated on-demand."
 )
@@ -81,19 +92,38 @@ st.caption(
 st.markdown(
     f"""
     ## Markets Closed?
-    Outside of regular trading hours, real-time views can be boring. To keep things interesting, you will see an option to use a replaying stream of historical trades as if it were real-time.
+    Outside of regular trading hours, real-time views can be boring. To keep things interesting, you can use a replaying stream of historical trades as if it were real-time; it is selected automatically while the market is closed.
     """
 )
-x_min = 0
-x_max = 0
-rt = st.radio("Real-time or replay?", ["Real-Time", "Replay"], index=0)
-plot = st.empty()
-plot.markdown(
-    """
-    <div style="height: 216px;">&nbsp;</div>
-    """,
-    unsafe_allow_html=True,
-)
+# Outside of trading hours the real-time table has nothing new, so the replay is selected by default
+rt = st.radio("Real-time or replay?", MODES, index=MODES.index(default_mode()))
+
+poller = get_poller()
+
+# The live chart reruns on its own without rerunning the page, every second while the live scheduler admits the
+# session, and is only sent the seconds that are new since its previous update
+interval = live_interval(view_interval(rt == "Real-Time", 1))
+
+@st.fragment(run_every=interval)
+def live_panel():
+    with fragment_run("app.live_panel"):
+        keep_live()
+        windows, last_timestamp = poller.poll(session_id(), [selectedTicker], rt == "Real-Time")
+        times, prices, valid = windows[selectedTicker]
+
+        x_range = None
+        if valid.any():
+            first = pd.Timestamp(times[valid][0])
+            last = pd.Timestamp(times[valid][-1])
+            if last - first < pd.Timedelta(minutes=5):
+                x_range = [first, first + pd.Timedelta(minutes=5)]
+            else:
+                x_range = [last - pd.Timedelta(minutes=5), last]
+
+        live_price(selectedTicker, times, prices, x_range, "", last_timestamp, key=f"live_price_{selectedTicker}_{rt}")
+
+if interval is not None:
+    live_panel()
 
 if rt == "Real-Time":
     st.caption(
@@ -115,7 +145,8 @@ st.markdown(
 now = nytz.localize(datetime.datetime(2024, 4, 9, 9, 31))
 dff = get_trades_second([selectedTicker], now - datetime.timedelta(seconds=60), now)
 fig = render_stock_history(selectedTicker, "Hour", dff, "")
-st.plotly_chart(fig)
+with span("st.plotly_chart"):
+    st.plotly_chart(fig)
 st.caption(
     f"The first 60 seconds of trading on April 9th, 2024 for {selectedTicker}, aggregated on-demand per-second."
 )
@@ -135,55 +166,4 @@ st.markdown(
     """
 )
 
-last_timestamp = None
-df = pd.DataFrame()
-
-emptyCount = 0
-while True:
-    new_dfs = get_realtime_second([selectedTicker], last_timestamp, rt == "Real-Time")
-    new_df = new_dfs[selectedTicker]
-
-    fullyEmpty = len(new_df) == 0
-
-    if len(new_df) > 0:
-        new_df = new_df[:-1]
-
-    if not new_df.empty and (
-        last_timestamp == None or last_timestamp < new_df["_id"].max()
-    ):
-        last_timestamp = new_df["_id"].max()
-
-        df = pd.concat([df, new_df], ignore_index=True)
-        df.drop_duplicates(subset="_id", keep="last", inplace=True)
-        df = df[df["_id"] >= (df["_id"].max() - pd.Timedelta(minutes=5))]
-
-        x_min = 0
-        x_max = 0
-        if df["_id"].max() - df["_id"].min() < pd.Timedelta(minutes=5):
-            x_min = df["_id"].min()
-            x_max = x_min + pd.Timedelta(minutes=5)
-        else:
-            x_min = df["_id"].max() - pd.Timedelta(minutes=5)
-            x_max = df["_id"].max()
-
-        fig = px.line(
-            df,
-            x="_id",
-            y="price",
-            labels={
-                "_id": "Time",
-                "price": "MSFT",
-            },
-            range_x=[x_min, x_max],
-            height=200,
-        )
-        fig.update_xaxes(title_text=None, showticklabels=True)
-        fig.update_yaxes(title_text=None, showticklabels=True)
-        fig.update_layout(
-            margin=dict(l=0, r=20, t=20, b=20),
-        )
-        plot.plotly_chart(fig)
-    elif fullyEmpty:
-        df = df = df.iloc[0:0]
-        last_timestamp = None
-    time.sleep(1)
+end()
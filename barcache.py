@@ -0,0 +1,104 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+# Results of the data functions cached in memory under one process-wide byte budget. Historical bars are cached
+# per (ticker, localDate, aggregation period) segment, so any range can be assembled from the days already fetched
+# and only the missing days have to be queried; other functions cache whole results by their arguments. Entries
+# can be given a TTL (the current day's segments are); the rest never expire. Once the entries' DataFrame memory
+# exceeds `max_bytes` the least recently used ones are evicted, whatever function they belong to. Hits, misses,
+# entries and bytes are counted per function for the Diagnostics page.
+class ResultCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {}
+
+    def get(self, function, key):
+        with self._lock:
+            stats = self._function_stats(function)
+            entry = self._entries.get((function, key))
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._remove((function, key))
+                entry = None
+            if entry is None:
+                stats["misses"] += 1
+                return None
+            stats["hits"] += 1
+            self._entries.move_to_end((function, key))
+            return entry[0]
+
+    def put(self, function, key, value, ttl=None):
+        size = sizeof(value)
+        with self._lock:
+            self._remove((function, key))
+            self._entries[(function, key)] = (value, None if ttl is None else time.monotonic() + ttl, size)
+            stats = self._function_stats(function)
+            stats["entries"] += 1
+            stats["bytes"] += size
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    # Drop every entry, or only those of one function
+    def clear(self, function=None):
+        with self._lock:
+            for entry_key in list(self._entries):
+                if function is None or entry_key[0] == function:
+                    self._remove(entry_key)
+
+    # [{"function", "entries", "bytes", "hits", "misses"}] per function seen so far
+    def stats(self):
+        with self._lock:
+            return [dict(function=function, **stats) for function, stats in self._stats.items()]
+
+    def _function_stats(self, function):
+        if function not in self._stats:
+            self._stats[function] = {"entries": 0, "bytes": 0, "hits": 0, "misses": 0}
+        return self._stats[function]
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            stats = self._stats[entry_key[0]]
+            stats["entries"] -= 1
+            stats["bytes"] -= entry[2]
+            self.bytes -= entry[2]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Memory held by a cached value: deep DataFrame memory, summed over the frames of a dict
+def sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict):
+        return sum(sizeof(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+# Group the missing days of each ticker into contiguous runs, and the tickers that share a run into one request:
+# returns [(tickers, first day, last day)]
+def plan_fetches(missing, days):
+    index = {day: i for i, day in enumerate(days)}
+    runs = {}
+    for ticker, ticker_days in missing.items():
+        start = None
+        previous = None
+        for day in ticker_days:
+            if start is not None and index[day] != index[previous] + 1:
+                runs.setdefault((start, previous), []).append(ticker)
+                start = None
+            if start is None:
+                start = day
+            previous = day
+        if start is not None:
+            runs.setdefault((start, previous), []).append(ticker)
+    return [(tickers, start, end) for (start, end), tickers in runs.items()]
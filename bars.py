@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS, IndicatorState
+
+# Bar lengths (seconds) the poller builds for every subscribed ticker
+BAR_SECONDS = (60, 300)
+
+BAR_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+
+# OHLCV bars of one ticker for the current day, built incrementally from trades. Completed bars are kept as they
+# are; a batch of new trades only touches the open bar and any bars it completes, so the cost per tick depends on
+# the number of new trades rather than on how far into the day it is. Times are epoch seconds of the naive New York
+# wall-clock time, like the poller's ring buffers. The indicator columns (see indicators.py) are kept up to date the
+# same way, one completed bar at a time, with the open bar's values computed on the fly.
+class BarBuilder:
+    def __init__(self, ticker, seconds):
+        self.ticker = ticker
+        self.seconds = seconds
+        self._completed = {column: [] for column in BAR_COLUMNS + INDICATOR_COLUMNS}
+        self._indicators = IndicatorState()
+        self._open = None
+        self._frame = None
+
+    # Start from bars already aggregated by the database (as returned by get_realtime_sofar); `before` (epoch
+    # seconds) drops the bars from there on, which are rebuilt from raw trades
+    def seed(self, df, before=None):
+        self._completed = {column: [] for column in BAR_COLUMNS + INDICATOR_COLUMNS}
+        self._indicators = IndicatorState()
+        self._open = None
+        self._frame = None
+        if df.empty:
+            return
+        starts = pd.to_datetime(df["date"]).values.astype("datetime64[s]").astype(np.int64) // self.seconds * self.seconds
+        keep = starts < before if before is not None else np.ones(len(starts), dtype=bool)
+        columns = [starts[keep]] + [df[column].to_numpy()[keep] for column in BAR_COLUMNS[1:]]
+        for bar in zip(*(column.tolist() for column in columns)):
+            self._complete(bar)
+
+    # Fold new trades (epoch seconds in ascending order, prices, sizes) into the bars. Trades for bars that are
+    # already complete are dropped.
+    def update(self, seconds, prices, sizes):
+        buckets = np.asarray(seconds, dtype=np.int64) // self.seconds * self.seconds
+        prices = np.asarray(prices, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.int64)
+        if self._open is not None:
+            keep = buckets >= self._open[0]
+            buckets, prices, sizes = buckets[keep], prices[keep], sizes[keep]
+        if not len(buckets):
+            return
+
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+        bars = np.column_stack(
+            [
+                buckets[starts],
+                prices[starts],
+                np.maximum.reduceat(prices, starts),
+                np.minimum.reduceat(prices, starts),
+                prices[ends],
+                np.add.reduceat(sizes, starts),
+            ]
+        ).tolist()
+
+        if self._open is not None and self._open[0] == bars[0][0]:
+            date, open_, high, low, close, volume = self._open
+            bars[0] = [date, open_, max(high, bars[0][2]), min(low, bars[0][3]), bars[0][4], volume + bars[0][5]]
+        elif self._open is not None:
+            bars.insert(0, self._open)
+
+        for bar in bars[:-1]:
+            self._complete(bar)
+            self._frame = None
+        self._open = bars[-1]
+
+    def _complete(self, bar):
+        for column, value in zip(BAR_COLUMNS, bar):
+            self._completed[column].append(value)
+        for column, value in self._indicators.update(bar).items():
+            self._completed[column].append(value)
+
+    # The bars so far, including the open one, with the columns of get_stock_min (dates in New York time)
+    def frame(self):
+        if self._frame is None:
+            self._frame = self._to_frame(self._completed)
+        if self._open is None:
+            return self._frame.copy()
+        open_ = dict(zip(BAR_COLUMNS, self._open), **self._indicators.peek(self._open))
+        open_ = self._to_frame({column: [value] for column, value in open_.items()})
+        if self._frame.empty:
+            return open_
+        return pd.concat([self._frame, open_], ignore_index=True)
+
+    def _to_frame(self, columns):
+        dates = np.asarray(columns["date"], dtype=np.int64).astype("datetime64[s]").astype("datetime64[ns]")
+        return pd.DataFrame(
+            {
+                "ticker": pd.Categorical([self.ticker] * len(dates)),
+                "date": pd.DatetimeIndex(dates).tz_localize("America/New_York"),
+                "open": np.asarray(columns["open"], dtype=np.float64),
+                "high": np.asarray(columns["high"], dtype=np.float64),
+                "low": np.asarray(columns["low"], dtype=np.float64),
+                "close": np.asarray(columns["close"], dtype=np.float64),
+                "volume": np.asarray(columns["volume"], dtype=np.int64),
+                **{column: np.asarray(columns[column], dtype=np.float64) for column in INDICATOR_COLUMNS},
+            }
+        )
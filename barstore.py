@@ -0,0 +1,168 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+SEGMENT_DTYPE = np.dtype(
+    [
+        ("date", "<M8[ns]"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<i8"),
+    ]
+)
+
+# Raised when the rule for final segments changes, which discards the segments written under the old one
+VERSION = 1
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS segments (
+        ticker TEXT NOT NULL,
+        day TEXT NOT NULL,
+        period TEXT NOT NULL,
+        path TEXT,
+        bytes INTEGER NOT NULL,
+        final INTEGER NOT NULL,
+        last_access REAL NOT NULL,
+        PRIMARY KEY (ticker, day, period)
+    )
+"""
+
+
+# Historical bar segments persisted on local disk so they survive restarts and redeploys. Each (ticker, localDate,
+# aggregation period) segment is written once to its own .npy file of SEGMENT_DTYPE records and memory-mapped when
+# read; a SQLite index records which segments are present, whether they are final (see data.is_final: the bars can
+# no longer change), their size and when they were last read. Days without bars are indexed without a file. Once the
+# files exceed `max_bytes` the least recently read segments are deleted.
+class BarStore:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        # Stores written before VERSION may hold segments marked final that were not
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < VERSION:
+            self.clear()
+            self._db.execute(f"PRAGMA user_version = {VERSION}")
+            self._db.commit()
+
+    # Segments present and final for any of the (ticker, day, period) keys, as {key: df}. `day` is the localDate
+    # datetime used by data.get_stock_min.
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        with self._lock:
+            rows = {}
+            for key in keys:
+                row = self._db.execute(
+                    "SELECT path FROM segments WHERE ticker = ? AND day = ? AND period = ? AND final = 1",
+                    _index_key(key),
+                ).fetchone()
+                if row is not None:
+                    rows[key] = row[0]
+            self._db.executemany(
+                "UPDATE segments SET last_access = ? WHERE ticker = ? AND day = ? AND period = ?",
+                [(time.time(), *_index_key(key)) for key in rows],
+            )
+            self._db.commit()
+
+        found = {}
+        for key, path in rows.items():
+            try:
+                found[key] = _to_frame(key[0], path and np.load(os.path.join(self.root, path), mmap_mode="r"))
+            except (OSError, ValueError):
+                # Deleted or truncated underneath the index; it is fetched and written again
+                continue
+        return found
+
+    # Write final segments given as [(key, df)]; segments already present are left as they are
+    def put_many(self, segments):
+        if not segments:
+            return
+        rows = []
+        for key, df in segments:
+            ticker, day, period = _index_key(key)
+            path = None
+            size = 0
+            if not df.empty:
+                path = os.path.join(period, ticker, f"{day}.npy")
+                size = _write(os.path.join(self.root, path), _to_records(df))
+            rows.append((ticker, day, period, path, size, 1, time.time()))
+        with self._lock:
+            self._db.executemany("INSERT OR IGNORE INTO segments VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM segments").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for ticker, day, period, path, size in self._db.execute(
+            "SELECT ticker, day, period, path, bytes FROM segments WHERE bytes > 0 ORDER BY last_access"
+        ):
+            evicted.append((ticker, day, period))
+            if path:
+                try:
+                    os.remove(os.path.join(self.root, path))
+                except FileNotFoundError:
+                    pass
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.executemany("DELETE FROM segments WHERE ticker = ? AND day = ? AND period = ?", evicted)
+        self._db.commit()
+
+    # (segments, bytes) held
+    def stats(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM segments").fetchone()
+
+    def clear(self):
+        with self._lock:
+            for (path,) in self._db.execute("SELECT path FROM segments WHERE path IS NOT NULL"):
+                try:
+                    os.remove(os.path.join(self.root, path))
+                except FileNotFoundError:
+                    pass
+            self._db.execute("DELETE FROM segments")
+            self._db.commit()
+
+
+def _index_key(key):
+    ticker, day, period = key
+    return ticker, (day.date() if isinstance(day, datetime.datetime) else day).isoformat(), period
+
+
+def _write(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, records)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def _to_records(df):
+    records = np.empty(len(df), dtype=SEGMENT_DTYPE)
+    records["date"] = pd.to_datetime(df["date"]).values
+    for field in SEGMENT_DTYPE.names[1:]:
+        records[field] = df[field].to_numpy()
+    return records
+
+
+def _to_frame(ticker, records):
+    if records is None:
+        records = np.empty(0, dtype=SEGMENT_DTYPE)
+    df = pd.DataFrame({field: records[field] for field in SEGMENT_DTYPE.names})
+    df.insert(0, "ticker", pd.Categorical([ticker] * len(df)))
+    return df
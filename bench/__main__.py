@@ -0,0 +1,110 @@
+# Offline benchmark suite: generates synthetic market data, loads it into a local MongoDB-compatible stand-in and
+# times the data.py/chart.py scenarios in bench/scenarios.py. One JSON line per scenario is appended to --out so
+# runs can be compared between commits.
+#
+#     python -m bench --uri mongodb://localhost:27017 --tickers 8 --days 90 --trades-per-sec 20
+#     python -m bench --skip-load --repeat 10 --scenario day_panel_90d_cold
+import argparse
+import atexit
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+# Point data.get_bar_store at a temporary directory for this run: the scenarios clear the on-disk store, which must
+# not be the app's own
+def private_bar_store():
+    path = tempfile.mkdtemp(prefix="bench-bars-")
+    atexit.register(shutil.rmtree, path, True)
+    os.environ["BAR_STORE_PATH"] = path
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--tickers", type=int, default=8)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--trades-per-sec", type=int, default=20, help="per ticker")
+    parser.add_argument("--trade-minutes", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    parser.add_argument("--skip-load", action="store_true", help="reuse the data already in the stand-in")
+    parser.add_argument("--out", default="bench-results.jsonl")
+    args = parser.parse_args()
+
+    # data.py connects through lib.init_connection, which honours this override
+    os.environ["SINGLESTORE_KAI_URI"] = args.uri
+    private_bar_store()
+
+    from bench import standin, synthetic
+    from bench.scenarios import SCENARIOS
+    from lib import init_connection
+
+    db = init_connection().stocks
+    if args.skip_load:
+        symbols = sorted(db.ticker_catalog.distinct("ticker"))
+        now = synthetic.now()
+        trade_start = db.trades.find_one(sort=[("localTS", 1)])["localTS"]
+        ctx = {
+            "symbols": symbols,
+            "now": now,
+            "trade_start": synthetic.nytz.localize(trade_start.replace(tzinfo=None)),
+        }
+    else:
+        started = time.perf_counter()
+        ctx = standin.load(db, args.tickers, args.days, args.trades_per_sec, args.trade_minutes)
+        print(f"loaded in {time.perf_counter() - started:.1f}s")
+
+    scale = {
+        "tickers": len(ctx["symbols"]),
+        "days": args.days,
+        "trades_per_sec": args.trades_per_sec,
+        "trade_minutes": args.trade_minutes,
+    }
+    names = args.scenario or list(SCENARIOS)
+
+    with open(args.out, "a") as out:
+        for name in names:
+            run = SCENARIOS[name](ctx)
+            run()  # warm up connections and imports
+            timings = []
+            rows = 0
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                rows = run()
+                timings.append((time.perf_counter() - started) * 1000)
+            result = {
+                "scenario": name,
+                "commit": commit(),
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "host": platform.node(),
+                "scale": scale,
+                "repeat": args.repeat,
+                "rows": rows,
+                "ms": {
+                    "min": float(np.min(timings)),
+                    "median": float(np.median(timings)),
+                    "p90": float(np.percentile(timings, 90)),
+                    "max": float(np.max(timings)),
+                },
+            }
+            out.write(json.dumps(result) + "\n")
+            print(f"{name:24s} median {result['ms']['median']:9.1f} ms  p90 {result['ms']['p90']:9.1f} ms  rows {rows}")
+
+
+if __name__ == "__main__":
+    main()
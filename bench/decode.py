@@ -0,0 +1,66 @@
+# Microbenchmark: decoding aggregation results, pd.DataFrame(cursor) + per-ticker masks vs columnar.decode + groupby.
+# Documents are produced lazily to mimic a cursor streaming batches from the server.
+#
+#     python -m bench.decode [--tickers 16] [--rows 35000]
+import argparse
+import datetime
+import time
+import tracemalloc
+
+import pandas as pd
+
+from columnar import decode, split_by_ticker
+from data import BAR_SCHEMA
+
+
+def cursor(tickers, rows):
+    start = datetime.datetime(2024, 1, 2, 9, 30)
+    for i in range(rows):
+        date = start + datetime.timedelta(minutes=i)
+        for ticker in tickers:
+            yield {
+                "ticker": ticker,
+                "date": date,
+                "open": 100.0 + i,
+                "high": 101.0 + i,
+                "low": 99.0 + i,
+                "close": 100.5 + i,
+                "volume": 1000 + i,
+            }
+
+
+def run_pandas(tickers, rows):
+    df = pd.DataFrame(cursor(tickers, rows))
+    return {ticker: df[df["ticker"] == ticker] for ticker in tickers}
+
+
+def run_columnar(tickers, rows):
+    df = decode(cursor(tickers, rows), BAR_SCHEMA)
+    return split_by_ticker(df, tickers)
+
+
+def measure(fn, tickers, rows):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn(tickers, rows)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=35000)
+    args = parser.parse_args()
+
+    tickers = [f"T{i:03d}" for i in range(args.tickers)]
+    print(f"tickers={args.tickers} rows/ticker={args.rows}")
+    for name, fn in [("pandas", run_pandas), ("columnar", run_columnar)]:
+        elapsed, peak = measure(fn, tickers, args.rows)
+        print(f"{name:10s} {elapsed:8.2f} s  peak {peak / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
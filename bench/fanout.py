@@ -0,0 +1,100 @@
+# Combined ($or over all tickers) vs per-ticker (one single-partition query each) execution of multi-ticker
+# requests, for 1, 4, 16 and 64 tickers. Run it against the cluster's SingleStore Kai endpoint to choose
+# data.DEFAULT_STRATEGY (query_strategy in secrets); against the local stand-in it only shows client-side overhead,
+# since the stand-in has no shards.
+#
+#     python -m bench.fanout --uri mongodb://localhost:27017 [--skip-load] [--repeat 5]
+#     python -m bench.fanout --uri "$SINGLESTORE_KAI_URI" --skip-load --tickers AAPL,MSFT,...
+import argparse
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+
+from bench.__main__ import commit, private_bar_store
+
+COUNTS = (1, 4, 16, 64)
+
+
+def queries(symbols, today):
+    from data import get_bar_store, get_realtime_second, get_result_cache, get_stock_min
+    from trading_calendar import nytz, previous_trading_day
+
+    day = previous_trading_day(today)
+    dd = nytz.localize(datetime.datetime(day.year, day.month, day.day))
+    d2 = nytz.localize(datetime.datetime(today.year, today.month, today.day)) + datetime.timedelta(days=1)
+
+    def clear():
+        get_result_cache().clear()
+        if get_bar_store() is not None:
+            get_bar_store().clear()
+
+    def day_90d(strategy):
+        clear()
+        return len(get_stock_min(symbols, d2 - datetime.timedelta(days=90), d2, "Day", strategy=strategy))
+
+    def minute_prev_day(strategy):
+        clear()
+        return len(get_stock_min(symbols, dd, dd, "Minute", strategy=strategy))
+
+    def realtime_second(strategy):
+        return sum(len(df) for df in get_realtime_second(symbols, None, True, strategy).values())
+
+    return {"day_90d": day_90d, "minute_prev_day": minute_prev_day, "realtime_second": realtime_second}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--skip-load", action="store_true", help="reuse the data already loaded")
+    parser.add_argument("--tickers", default=None, help="comma separated; defaults to the catalog")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default="bench-results.jsonl")
+    args = parser.parse_args()
+
+    os.environ["SINGLESTORE_KAI_URI"] = args.uri
+    private_bar_store()
+
+    from bench import standin, synthetic
+    from data import STRATEGIES
+    from lib import init_connection
+
+    db = init_connection().stocks
+    if not args.skip_load:
+        standin.load(db, max(COUNTS), args.days, 5, 10)
+    symbols = args.tickers.split(",") if args.tickers else sorted(db.ticker_catalog.distinct("ticker"))
+    today = synthetic.now().date()
+
+    with open(args.out, "a") as out:
+        for count in COUNTS:
+            if count > len(symbols):
+                break
+            for name, run in queries(symbols[:count], today).items():
+                for strategy in STRATEGIES:
+                    run(strategy)  # warm up connections
+                    timings = []
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        rows = run(strategy)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    result = {
+                        "scenario": f"fanout_{name}",
+                        "commit": commit(),
+                        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "tickers": count,
+                        "strategy": strategy,
+                        "rows": rows,
+                        "ms": {"median": float(np.median(timings)), "p90": float(np.percentile(timings, 90))},
+                    }
+                    out.write(json.dumps(result) + "\n")
+                    print(
+                        f"{name:16s} {count:3d} tickers  {strategy:10s} "
+                        f"median {result['ms']['median']:9.1f} ms  p90 {result['ms']['p90']:9.1f} ms  rows {rows}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Throughput of realtime_client.Ingester against the ~30,000 trades/sec peak of April 9th, 2024. Synthetic messages
+# in the websocket format are written to a file and ingested through the file source. By default batches go to a
+# sink that BSON-encodes them (the client-side cost of insert_many) without sending; with --uri they are inserted
+# into the stand-in's realtime_bench collection. CPU time is process-wide, so "cores at peak" is the share of one
+# core the client would use while the feed runs at the peak rate.
+#
+#     python -m bench.ingest [--trades 600000] [--per-message 50] [--uri mongodb://localhost:27017]
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import time
+
+import bson
+
+from bench import synthetic
+from realtime_client import Ingester, file_messages
+
+PEAK_TRADES_PER_SECOND = 30_000
+
+
+class EncodeOnly:
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            bson.encode(document)
+
+
+def write_messages(path, trades, per_message, tickers):
+    symbols = synthetic.tickers(tickers)
+    start = synthetic.nytz.localize(datetime.datetime(2024, 4, 9, 9, 30))
+    seconds = max(1, trades // (PEAK_TRADES_PER_SECOND))
+    df = synthetic.trades(symbols, start, start + datetime.timedelta(seconds=seconds), trades // seconds // tickers)
+    df = df.sort_values("sip_timestamp")
+    events = [
+        {
+            "ev": "T",
+            "sym": ticker,
+            "i": str(q),
+            "x": 11,
+            "p": round(p, 4),
+            "s": int(s),
+            "c": [14, 41],
+            "t": int(t // 1_000_000),
+            "q": int(q),
+            "z": 3,
+        }
+        for ticker, p, s, t, q in zip(df["ticker"], df["price"], df["size"], df["sip_timestamp"], df["sequence_number"])
+    ]
+    with open(path, "w") as f:
+        for i in range(0, len(events), per_message):
+            f.write(json.dumps(events[i:i + per_message], separators=(",", ":")) + "\n")
+    return len(events), os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=600_000)
+    parser.add_argument("--per-message", type=int, default=50)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--uri", default=None)
+    args = parser.parse_args()
+
+    if args.uri:
+        import pymongo
+
+        collection = pymongo.MongoClient(args.uri).stocks.realtime_bench
+        collection.drop()
+    else:
+        collection = EncodeOnly()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trades.jsonl")
+        trades, size = write_messages(path, args.trades, args.per_message, args.tickers)
+
+        ingester = Ingester(collection, batch_size=args.batch_size)
+        wall, cpu = time.perf_counter(), time.process_time()
+        asyncio.run(ingester.run(file_messages(path)))
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    rate = ingester.inserted / wall
+    feed_seconds = trades / PEAK_TRADES_PER_SECOND
+    print(f"{trades:,} trades in {size / 1e6:.1f} MB, {ingester.batches} batches, {ingester.failed} failed")
+    print(f"wall {wall:.2f}s, {rate:,.0f} trades/s ({rate / PEAK_TRADES_PER_SECOND:.1f}x the peak)")
+    print(f"cpu {cpu:.2f}s, {cpu / feed_seconds:.2f} cores at peak, backpressure waits {ingester.waited:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Figure payload size as the requested range grows, with and without downsampling.
+#
+#     python -m bench.payload [--points 350]
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from chart import render_stock_history
+from downsample import pick_aggregation_period
+from trading_calendar import session, trading_days
+
+
+# Synthetic bars for every slot of the extended session on each trading day in the range
+def make_bars(d1, d2, aggregation_period):
+    if aggregation_period == "Day":
+        dates = pd.Series(trading_days(d1.date(), d2.date()))
+    else:
+        freq = "h" if aggregation_period == "Hour" else "5min"
+        dates = pd.concat(
+            [
+                pd.Series(pd.date_range(bounds.pre_open, bounds.post_close, freq=freq, inclusive="left"))
+                for bounds in map(session, trading_days(d1.date(), d2.date()))
+            ],
+            ignore_index=True,
+        )
+    price = 100 + np.cumsum(np.random.default_rng(0).standard_normal(len(dates)))
+    return pd.DataFrame(
+        {"ticker": "NVDA", "date": dates, "open": price, "high": price + 1, "low": price - 1, "close": price, "volume": 1000}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=350)
+    args = parser.parse_args()
+
+    d2 = datetime.datetime(2024, 6, 28, 20)
+    print(f"{'days':>5} {'period':>7} {'bars':>7} {'full KiB':>9} {'auto KiB':>9}")
+    for days in (1, 5, 30, 90, 180, 365):
+        d1 = d2 - datetime.timedelta(days=days)
+        full = make_bars(d1, d2, "Minute")
+        full_size = len(render_stock_history("NVDA", "Minute", full, "", max_points=len(full)).to_json())
+        aggregation_period = pick_aggregation_period(d1, d2, args.points)
+        bars = make_bars(d1, d2, aggregation_period)
+        auto_size = len(render_stock_history("NVDA", aggregation_period, bars, "", max_points=args.points).to_json())
+        print(f"{days:5d} {aggregation_period:>7} {len(full):7d} {full_size / 1024:9.1f} {auto_size / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Microbenchmark: live price window maintenance, pandas concat/drop_duplicates/filter vs PriceRing.
+#
+#     python -m bench.ringbuffer [--ticks 3000] [--window 300] [--per-tick 2]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ringbuffer import PriceRing, to_epoch_seconds
+
+
+# Each tick returns the seconds since the previous watermark, including the re-read watermark second
+def make_ticks(ticks, per_tick):
+    start = pd.Timestamp("2024-04-09 09:30:00")
+    rng = np.random.default_rng(0)
+    out = []
+    for i in range(ticks):
+        ids = [start + pd.Timedelta(seconds=i * per_tick + j) for j in range(per_tick + 1)]
+        out.append(pd.DataFrame({"_id": ids, "ticker": "NVDA", "price": 880 + rng.standard_normal(len(ids))}))
+    return out
+
+
+def run_pandas(ticks, window):
+    df = pd.DataFrame()
+    started = time.perf_counter()
+    for new_df in ticks:
+        df = pd.concat([df, new_df], ignore_index=True)
+        df.drop_duplicates(subset="_id", keep="last", inplace=True)
+        df = df[df["_id"] >= (df["_id"].max() - pd.Timedelta(seconds=window))]
+    return time.perf_counter() - started
+
+
+def run_ring(ticks, window):
+    ring = PriceRing(window)
+    started = time.perf_counter()
+    for new_df in ticks:
+        ring.upsert(to_epoch_seconds(new_df["_id"]), new_df["price"].to_numpy())
+        ring.window()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--window", type=int, default=300)
+    parser.add_argument("--per-tick", type=int, default=2)
+    args = parser.parse_args()
+
+    ticks = make_ticks(args.ticks, args.per_tick)
+    pandas_s = run_pandas(ticks, args.window)
+    ring_s = run_ring(ticks, args.window)
+
+    print(f"ticks={args.ticks} window={args.window}s per_tick={args.per_tick}")
+    print(f"pandas   {pandas_s * 1e6 / args.ticks:10.1f} us/tick")
+    print(f"ring     {ring_s * 1e6 / args.ticks:10.1f} us/tick")
+    print(f"speedup  {pandas_s / ring_s:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
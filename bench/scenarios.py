@@ -0,0 +1,162 @@
+# Timed scenarios over data.py and chart.py against the loaded stand-in. Each scenario returns a callable that runs
+# one repetition and returns the number of rows it produced.
+import datetime
+from concurrent.futures import as_completed
+
+from chart import render_stock_history
+from data import (
+    get_bar_store,
+    get_previous_session,
+    get_realtime_second,
+    get_realtime_trades,
+    get_result_cache,
+    get_stock_min,
+    get_trades_second,
+    get_trades_second_ticker,
+    submit,
+)
+from lib import get_reference
+from trading_calendar import nytz, previous_trading_day
+
+PANEL_TICKERS = 4
+
+
+def _midnight(day):
+    return nytz.localize(datetime.datetime(day.year, day.month, day.day))
+
+
+def _clear_bar_store():
+    store = get_bar_store()
+    if store is not None:
+        store.clear()
+
+
+# The dashboard's "Trading In Previous 90 Days" panel with empty bar caches ("cold"), after a restart (only the
+# on-disk store is populated) or with everything in memory ("warm")
+def day_panel(ctx, state):
+    symbols = ctx["symbols"][:PANEL_TICKERS]
+    d2 = _midnight(ctx["now"].date() + datetime.timedelta(days=1))
+    d1 = d2 - datetime.timedelta(days=90)
+
+    def run():
+        if state != "warm":
+            get_result_cache().clear()
+        if state == "cold":
+            _clear_bar_store()
+        return len(get_stock_min(symbols, d1, d2, "Day"))
+
+    return run
+
+
+# The dashboard's "Previous Trading Day" panel of 5-minute bars
+def minute_panel(ctx):
+    symbols = ctx["symbols"][:PANEL_TICKERS]
+    day = _midnight(previous_trading_day(ctx["now"].date()))
+
+    def run():
+        get_result_cache().clear()
+        _clear_bar_store()
+        return len(get_stock_min(symbols, day, day, "Minute"))
+
+    return run
+
+
+# Per-second aggregation of the first minute of historical trades
+def trades_second(ctx):
+    symbols = ctx["symbols"][:PANEL_TICKERS]
+    d1 = ctx["trade_start"]
+    d2 = d1 + datetime.timedelta(seconds=60)
+
+    def run():
+        get_trades_second_ticker.clear()
+        return len(get_trades_second(symbols, d1, d2))
+
+    return run
+
+
+# One session's realtime polling by per-second aggregates: an initial full read followed by incremental polls from the watermark
+def realtime_polling(ctx, polls=20):
+    symbols = ctx["symbols"][:PANEL_TICKERS]
+
+    def run():
+        rows = 0
+        last = None
+        for _ in range(polls):
+            new_dfs = get_realtime_second(symbols, last, True)
+            max_ids = [df["_id"].max() for df in new_dfs.values() if not df.empty]
+            rows += sum(len(df) for df in new_dfs.values())
+            if max_ids:
+                last = max(max_ids)
+        return rows
+
+    return run
+
+
+# The same polling by raw trades after a per-ticker (localTS, sequence_number) watermark, as the poller does
+def realtime_incremental(ctx, polls=20):
+    symbols = ctx["symbols"][:PANEL_TICKERS]
+
+    def run():
+        rows = 0
+        watermarks = {ticker: None for ticker in symbols}
+        for _ in range(polls):
+            for ticker, new_df in get_realtime_trades(watermarks, True).items():
+                rows += len(new_df)
+                if not new_df.empty:
+                    watermarks[ticker] = (new_df["localTS"].iat[-1], int(new_df["sequence_number"].iat[-1]))
+        return rows
+
+    return run
+
+
+# The dashboard's page load with cold caches: the reference lookup, the previous trading day and the 90-day panel,
+# one after another or all started at once
+def dashboard_load(ctx, concurrent):
+    symbols = ctx["symbols"][:PANEL_TICKERS]
+    today = ctx["now"].date()
+    d2 = _midnight(today + datetime.timedelta(days=1))
+    d1 = d2 - datetime.timedelta(days=90)
+    calls = [
+        (get_reference, (tuple(symbols),)),
+        (get_previous_session, (symbols, today)),
+        (get_stock_min, (symbols, d1, d2, "Day")),
+    ]
+
+    def run():
+        get_result_cache().clear()
+        _clear_bar_store()
+        get_reference.clear()
+        if concurrent:
+            results = [future.result() for future in as_completed([submit(fn, *args) for fn, args in calls])]
+        else:
+            results = [fn(*args) for fn, args in calls]
+        return len(results)
+
+    return run
+
+
+# Building and serializing the 90-day candlestick figure for one ticker
+def render_day_panel(ctx):
+    symbols = ctx["symbols"][:1]
+    d2 = _midnight(ctx["now"].date() + datetime.timedelta(days=1))
+    df = get_stock_min(symbols, d2 - datetime.timedelta(days=90), d2, "Day")
+
+    def run():
+        render_stock_history(symbols[0], "Day", df, "").to_json()
+        return len(df)
+
+    return run
+
+
+SCENARIOS = {
+    "day_panel_90d_cold": lambda ctx: day_panel(ctx, "cold"),
+    "day_panel_90d_restart": lambda ctx: day_panel(ctx, "restart"),
+    "day_panel_90d_warm": lambda ctx: day_panel(ctx, "warm"),
+    "prev_day_minute_panel": minute_panel,
+    "trades_per_second": trades_second,
+    "realtime_polling": realtime_polling,
+    "realtime_incremental": realtime_incremental,
+    "dashboard_load_sequential": lambda ctx: dashboard_load(ctx, concurrent=False),
+    "dashboard_load_concurrent": lambda ctx: dashboard_load(ctx, concurrent=True),
+    "render_day_panel": render_day_panel,
+}
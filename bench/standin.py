@@ -0,0 +1,56 @@
+# Loads synthetic data into a local MongoDB-compatible database standing in for the SingleStore cluster.
+# Any MongoDB 5.0+ server works (the pipelines use $dateTrunc), e.g.
+#
+#     docker run --rm -p 27017:27017 mongo:7
+import datetime
+
+from bench import synthetic
+from trading_calendar import session
+
+BATCH = 20_000
+
+
+def insert(collection, df):
+    collection.drop()
+    records = df.to_dict("records") if hasattr(df, "to_dict") else df
+    for i in range(0, len(records), BATCH):
+        collection.insert_many(records[i:i + BATCH], ordered=False)
+    return len(records)
+
+
+# Build the stocks database at the given scale:
+# - stocks_min (plus the stocks_day/stocks_hour rollups, ticker_catalog and rollup_status) for `days` trading days
+#   before today
+# - trades for the first `trade_minutes` minutes of the regular session of the most recent of those days
+# - realtime for the last `trade_minutes` minutes up to now, and replay as a copy of the historical trades
+def load(db, tickers, days, trades_per_second, trade_minutes, log=print):
+    symbols = synthetic.tickers(tickers)
+    now = synthetic.now()
+    history = synthetic.history_days(now.date(), days)
+
+    counts = {}
+    minute = synthetic.stocks_min(symbols, history)
+    day, hour, catalog = synthetic.rollups(minute)
+    counts["stocks_min"] = insert(db.stocks_min, minute)
+    counts["stocks_day"] = insert(db.stocks_day, day)
+    counts["stocks_hour"] = insert(db.stocks_hour, hour)
+    counts["ticker_catalog"] = insert(db.ticker_catalog, catalog)
+    status = {"name": "stocks_min", "firstDate": day["localDate"].min(), "lastDate": day["localDate"].max()}
+    counts["rollup_status"] = insert(db.rollup_status, [status])
+
+    open_ = session(history[-1]).open
+    trades = synthetic.trades(symbols, open_, open_ + datetime.timedelta(minutes=trade_minutes), trades_per_second)
+    counts["trades"] = insert(db.trades, trades)
+    counts["replay"] = insert(db.replay, synthetic.realtime(trades))
+
+    live = synthetic.trades(symbols, now - datetime.timedelta(minutes=trade_minutes), now, trades_per_second, seed=1)
+    counts["realtime"] = insert(db.realtime, synthetic.realtime(live))
+
+    counts["reference"] = insert(db.reference, synthetic.reference(symbols))
+
+    for name in ("stocks_min", "stocks_day", "stocks_hour", "trades", "realtime", "replay"):
+        db[name].create_index([("localDate", 1), ("ticker", 1), ("localTS", 1)])
+
+    for name, count in counts.items():
+        log(f"loaded {count:>10,} {name}")
+    return {"symbols": symbols, "history": history, "trade_start": open_, "now": now}
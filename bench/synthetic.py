@@ -0,0 +1,143 @@
+# Synthetic market data shaped like the documents SingleStore Kai returns for stocks_min, trades, realtime and
+# reference. Times follow the tables' conventions: localTS/localDate are naive New York wall-clock datetimes,
+# window_start/sip_timestamp are UTC epoch nanoseconds and the realtime timestamp is UTC epoch milliseconds.
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import nytz, previous_trading_day, session
+
+
+def tickers(count):
+    return [f"T{i:03d}" for i in range(count)]
+
+
+# The `days` trading days before `today`, oldest first
+def history_days(today, days):
+    out = []
+    day = today
+    for _ in range(days):
+        day = previous_trading_day(day)
+        out.append(day)
+    return out[::-1]
+
+
+def _walk(rng, n, start):
+    return start * np.exp(np.cumsum(rng.normal(0, 0.0005, n)))
+
+
+def _local(stamps):
+    return stamps.tz_convert(nytz).tz_localize(None)
+
+
+# One minute bar per ticker for every minute of the extended session of each day
+def stocks_min(symbols, days, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for day in days:
+        bounds = session(day)
+        starts = pd.date_range(bounds.pre_open, bounds.post_close, freq="min", inclusive="left")
+        local = _local(starts)
+        for i, ticker in enumerate(symbols):
+            close = _walk(rng, len(starts), 50 + 10 * i)
+            spread = np.abs(rng.normal(0, 0.001, len(starts))) * close
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "localTS": local,
+                        "localDate": local.normalize(),
+                        "ticker": ticker,
+                        "volume": rng.integers(100, 50_000, len(starts)),
+                        "open": close * (1 + rng.normal(0, 0.0005, len(starts))),
+                        "close": close,
+                        "high": close + spread,
+                        "low": close - spread,
+                        "window_start": starts.as_unit("ns").asi8,
+                        "transactions": rng.integers(1, 500, len(starts)),
+                    }
+                )
+            )
+    df = pd.concat(frames, ignore_index=True)
+    df["high"] = df[["open", "close", "high"]].max(axis=1)
+    df["low"] = df[["open", "close", "low"]].min(axis=1)
+    return df
+
+
+# The same daily and hourly rollups rollup.py builds from stocks_min
+def rollups(minute):
+    aggregations = {
+        "volume": ("volume", "sum"),
+        "open": ("open", "first"),
+        "close": ("close", "last"),
+        "high": ("high", "max"),
+        "low": ("low", "min"),
+        "transactions": ("transactions", "sum"),
+        "bars": ("open", "size"),
+    }
+    minute = minute.sort_values(["ticker", "localTS"])
+    day = minute.groupby(["localDate", "ticker"]).agg(**aggregations).reset_index()
+    hour = (
+        minute.assign(localTS=minute["localTS"].dt.floor("h"))
+        .groupby(["localTS", "localDate", "ticker"])
+        .agg(**aggregations)
+        .reset_index()
+    )
+    catalog = day.groupby("ticker")["localDate"].agg(firstDate="min", lastDate="max").reset_index()
+    return day, hour, catalog
+
+
+# Individual trades at `rate` per second per ticker over [start, end) (tz-aware New York datetimes); the columns
+# used by both the trades and realtime tables
+def trades(symbols, start, end, rate, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = int((end - start).total_seconds())
+    n = seconds * rate
+    base = pd.Timestamp(start).tz_convert("UTC").value
+    frames = []
+    for i, ticker in enumerate(symbols):
+        stamps = np.sort(base + rng.integers(0, seconds * 1_000_000_000, n))
+        utc = pd.DatetimeIndex(stamps, tz="UTC")
+        local = _local(utc)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "localTS": local,
+                    "localDate": local.normalize(),
+                    "ticker": ticker,
+                    "price": _walk(rng, n, 50 + 10 * i),
+                    "size": rng.integers(1, 500, n),
+                    "sequence_number": np.arange(n, dtype=np.int64) + 1,
+                    "sip_timestamp": stamps,
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def realtime(trade_frame):
+    df = trade_frame[["localTS", "localDate", "ticker", "price", "size", "sequence_number"]].copy()
+    df["timestamp"] = trade_frame["sip_timestamp"] // 1_000_000
+    return df
+
+
+def reference(symbols):
+    return [
+        {
+            "_id": ticker,
+            "details": {
+                "ticker": ticker,
+                "name": f"Synthetic Company {ticker} Inc.",
+                "market": "stocks",
+                "primary_exchange": "XNAS",
+                "market_cap": 1e9 * (i + 1),
+                "list_date": "2015-01-02",
+                "description": "Synthetic reference document. " * 40,
+            },
+        }
+        for i, ticker in enumerate(symbols)
+    ]
+
+
+def now():
+    return datetime.datetime.now(nytz)
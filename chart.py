@@ -1,36 +1,70 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 
-def render_stock_history(ticker, aggregation_period, df, title):
-    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.1)
+from downsample import DEFAULT_POINTS, ohlc_buckets
+from indicators import INDICATORS
+from tracing import traced
 
-    d1 = min(df['date'])
-    d2 = max(df['date'])
+# Slot width of each aggregation period
+PERIOD_STEPS = {
+    "Day": np.timedelta64(1, "D"),
+    "Hour": np.timedelta64(1, "h"),
+    "Minute": np.timedelta64(5, "m"),
+}
 
-    ticker_data = df[df["ticker"] == ticker]
+# Find the runs of empty slots between bars and return them as [start, end) rangebreak bounds. `dates` are the bar
+# times as datetime64 values; they are snapped to the slot grid starting at `origin`, so the work is a sort plus one
+# diff over the bars rather than a membership test for every slot in the range.
+def find_gaps(dates, step, origin):
+    if len(dates) < 2:
+        return []
+    snapped = np.unique(origin + ((dates - origin) // step) * step)
+    breaks = np.flatnonzero(np.diff(snapped) > step)
+    starts = snapped[breaks] + step
+    ends = snapped[breaks + 1]
+    return [[pd.Timestamp(start), pd.Timestamp(end)] for start, end in zip(starts, ends)]
 
-    full_date_range = ""
+# Bar times as naive datetime64 values (wall-clock time for intraday bars, midnight for daily bars)
+def to_datetime64(dates, aggregation_period):
     if aggregation_period == "Day":
-        full_date_range = pd.date_range(start=d1, end=d2, inclusive="left", freq="D", ambiguous=True )
-    elif aggregation_period == "Hour":
-        full_date_range = pd.date_range(start=d1, end=d2, inclusive="left", freq="h", ambiguous=True )
-    elif aggregation_period == "Minute":
-        full_date_range = pd.date_range(start=d1, end=d2, inclusive="left", freq="5min", ambiguous=True )
+        return pd.to_datetime(pd.Series(dates)).values
+    return pd.Series(dates).dt.tz_localize(None).values
 
-    dvalue = None
+# Line style of each indicator column drawn over the candlesticks
+OVERLAY_LINES = {
+    "sma": dict(color="#ff7f0e", width=1),
+    "ema": dict(color="#9467bd", width=1),
+    "bb_upper": dict(color="#7f7f7f", width=1, dash="dot"),
+    "bb_lower": dict(color="#7f7f7f", width=1, dash="dot"),
+    "vwap": dict(color="#17becf", width=1, dash="dash"),
+}
 
-    if aggregation_period == "Day":
-        full_date_range = full_date_range.date
-    elif aggregation_period == "Hour":
-        dvalue = 60 * 60 * 1000
-        full_date_range = pd.DatetimeIndex(full_date_range)
-    else:
-        dvalue = 60 * 1000
-        full_date_range = pd.DatetimeIndex(full_date_range)
+# Candlesticks and volume for one ticker; more than max_points bars are merged into OHLC buckets before plotting.
+# `indicators` (names from indicators.INDICATORS, whose columns the frame must have) are drawn over the candlesticks,
+# except RSI, which gets a row of its own.
+@traced()
+def render_stock_history(ticker, aggregation_period, df, title, max_points=DEFAULT_POINTS, indicators=()):
+    showRsi = "RSI 14" in indicators
+    fig = make_subplots(
+        rows=3 if showRsi else 2,
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.1,
+        row_heights=[0.5, 0.25, 0.25] if showRsi else None,
+    )
 
-    data_dates = df['date'].unique()
-    missing_dates = pd.DatetimeIndex([date for date in full_date_range if date not in data_dates])
+    ticker_data = df[df["ticker"] == ticker]
+
+    # Gaps are taken from the bars of every ticker in the frame, starting at this ticker's first bar
+    step = PERIOD_STEPS.get(aggregation_period, PERIOD_STEPS["Minute"])
+    origin = to_datetime64([df["date"].min()], aggregation_period)[0]
+    ticker_min = to_datetime64([ticker_data["date"].min()], aggregation_period)[0]
+    data_dates = to_datetime64(df["date"].unique(), aggregation_period)
+    gaps = find_gaps(data_dates[data_dates >= ticker_min], step, origin)
+
+    ticker_data = ohlc_buckets(ticker_data, max_points)
 
     fig.add_trace(go.Bar(
         x=ticker_data['date'],
@@ -50,13 +84,32 @@ def render_stock_history(ticker, aggregation_period, df, title):
         ), row=1, col=1
     )
 
-    if aggregation_period == "Day":
-        missing_dates = [date for date in missing_dates if date.date() >= min(ticker_data['date'])]
-    else:
-        missing_dates = [date for date in missing_dates if date >= min(ticker_data['date'])]
+    for name in indicators:
+        for column in INDICATORS[name]:
+            if column in OVERLAY_LINES:
+                fig.add_trace(go.Scatter(
+                    x=ticker_data["date"],
+                    y=ticker_data[column],
+                    name=name,
+                    mode="lines",
+                    line=OVERLAY_LINES[column],
+                    hoverinfo="skip",
+                ), row=1, col=1)
+
+    if showRsi:
+        fig.add_trace(go.Scatter(
+            x=ticker_data["date"],
+            y=ticker_data["rsi"],
+            name="RSI 14",
+            mode="lines",
+            line=dict(color="#9467bd", width=1),
+        ), row=3, col=1)
+        for level in (30, 70):
+            fig.add_hline(y=level, line=dict(color="#7f7f7f", width=1, dash="dot"), row=3, col=1)
+        fig.update_yaxes(range=[0, 100], tickvals=[30, 70], row=3, col=1)
 
-    min_date = min(ticker_data['date'])
-    max_date = max(ticker_data['date'])
+    min_date = ticker_data['date'].min()
+    max_date = ticker_data['date'].max()
 
     ticktext = None
     if aggregation_period == "Day":
@@ -71,17 +124,17 @@ def render_stock_history(ticker, aggregation_period, df, title):
         tickangle=0,
         tickvals=[min_date, max_date],
         ticktext=ticktext,
-        rangebreaks=[dict(values=missing_dates, dvalue=dvalue)],
+        rangebreaks=[dict(bounds=gap) for gap in gaps],
         rangeslider=dict(visible=False),
     )
 
     fig.update_layout(
         title=title,
         yaxis1=dict(automargin=True),
-        yaxis2=dict(range=[0, max(ticker_data['volume'])], automargin=True),
+        yaxis2=dict(range=[0, ticker_data['volume'].max()], automargin=True),
         showlegend=False,
         margin=dict(l=50, r=50, t=20, b=0),
-        height=200
+        height=260 if showRsi else 200
     )
 
-    return fig
\ No newline at end of file
+    return fig
@@ -0,0 +1,53 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Documents are decoded this many at a time, so only one batch of Python dicts is ever alive
+CHUNK_SIZE = 50_000
+
+
+# Decode an aggregation cursor straight into typed columns instead of building a DataFrame from a list of dicts.
+# `schema` maps each field to one of "datetime", "float", "int" or "category"; fields not in the schema are ignored.
+def decode(cursor, schema):
+    chunks = {field: [] for field in schema}
+    categories = {field: {} for field, kind in schema.items() if kind == "category"}
+
+    cursor = iter(cursor)
+    while True:
+        docs = list(itertools.islice(cursor, CHUNK_SIZE))
+        if not docs:
+            break
+        n = len(docs)
+        for field, kind in schema.items():
+            if kind == "float":
+                chunks[field].append(np.fromiter((doc[field] for doc in docs), dtype=np.float64, count=n))
+            elif kind == "int":
+                chunks[field].append(np.fromiter((doc[field] for doc in docs), dtype=np.int64, count=n))
+            elif kind == "datetime":
+                chunks[field].append(pd.to_datetime([doc[field] for doc in docs]).values)
+            elif kind == "category":
+                lookup = categories[field]
+                chunks[field].append(
+                    np.fromiter((lookup.setdefault(doc[field], len(lookup)) for doc in docs), dtype=np.int32, count=n)
+                )
+
+    if not any(chunks.values()):
+        return pd.DataFrame()
+
+    columns = {}
+    for field, kind in schema.items():
+        values = np.concatenate(chunks[field])
+        if kind == "category":
+            columns[field] = pd.Categorical.from_codes(values, categories=list(categories[field]))
+        else:
+            columns[field] = values
+    return pd.DataFrame(columns)
+
+
+# Split a result into one frame per requested ticker with a single groupby pass
+def split_by_ticker(df, tickers):
+    if df.empty:
+        return {ticker: pd.DataFrame() for ticker in tickers}
+    groups = dict(iter(df.groupby("ticker", observed=True, sort=False)))
+    return {ticker: groups[ticker] if ticker in groups else df.iloc[0:0] for ticker in tickers}
@@ -2,12 +2,18 @@ import streamlit as st
 import pandas as pd
 import datetime
 import pytz
-import time
-import plotly.express as px
+from concurrent.futures import as_completed
 
-from lib import get_tickers, init_nav, init_connection
-from data import get_stock_min, get_realtime_second, get_realtime_sofar
+from lib import get_tickers, get_reference, init_nav
+from data import get_stock_min_indicators_async, get_previous_session_async, submit
+from poller import get_poller, session_id
 from chart import render_stock_history
+from downsample import points_for_width
+from indicators import INDICATORS, PRICE_INDICATORS
+from livechart import live_price
+from refresh import MODES, default_mode, view_interval
+from scheduler import keep_live, live_interval
+from tracing import begin, end, fragment_run, span
 
 st.set_page_config(
     page_title="Real-Time Stocks With SingleStore",
@@ -16,12 +22,16 @@ st.set_page_config(
 
 init_nav()
 
-tickers = get_tickers()
+# The run's spans (data.py, chart.py and the sections below) form a timeline; add ?trace=1 to the URL to see it
+begin("dashboard")
+
+with span("dashboard.tickers"):
+    tickers = get_tickers()
 
 st.title("Dashboard")
 
 selectedTickers = st.multiselect(
-    "Tickers", tickers, ["INTC", "NVDA", "MSFT", "SNOW"]
+    "Tickers", tickers["ticker"], ["INTC", "NVDA", "MSFT", "SNOW"]
 )
 
 if "selectedTickers" not in st.session_state:
@@ -31,7 +41,12 @@ elif st.session_state.selectedTickers != selectedTickers:
     st.session_state.selectedTickers = selectedTickers
     st.rerun()
 
-rt = st.radio("Real-time or replay?", ["Real-Time", "Replay"], index=0)
+# Outside of trading hours the real-time table has nothing new, so the replay is selected by default
+rt = st.radio("Real-time or replay?", MODES, index=MODES.index(default_mode()))
+
+# Drawn over the bar charts; the price-only ones over the live prices too
+indicators = st.multiselect("Indicators", list(INDICATORS), [])
+liveIndicators = [name for name in indicators if name in PRICE_INDICATORS]
 
 nytz = pytz.timezone("America/New_York")
 now = datetime.datetime.now(nytz)
@@ -40,48 +55,113 @@ df = pd.DataFrame(columns=["ticker"])
 
 st.write("Updated as of " + now.strftime("%A, %B %d, %Y %H:%M:%S" + " EST"))
 
-client = init_connection()
-db = client.stocks
+# The wide layout splits roughly this many pixels between the ticker columns
+chart_points = points_for_width(1200 / max(1, len(selectedTickers)))
 
-plots = [None] * len(selectedTickers)
-plots2 = [None] * len(selectedTickers)
+# The reference lookup and the history panels are independent: all of them are started at once and each panel is
+# drawn as soon as its own query completes, so the page is ready after the slowest query rather than their sum
+
+d2 = now
+d2 = (d2 + datetime.timedelta(days=1)).replace(
+    hour=0, minute=0, second=0, microsecond=0
+)
+dd2 = nytz.localize(datetime.datetime(d2.year, d2.month, d2.day))
+dd1 = dd2 + datetime.timedelta(days=-90)
+
+futures = {
+    submit(get_reference, tuple(sorted(selectedTickers))): "reference",
+    get_previous_session_async(selectedTickers, now.date(), indicators=indicators): "previous_day",
+    get_stock_min_indicators_async(selectedTickers, dd1, dd2, "Day", indicators): "last_90_days",
+}
+
+names = [None] * len(selectedTickers)
 cols = st.columns(len(selectedTickers))
 for index, selectedTicker in enumerate(selectedTickers):
     cols[index].header(selectedTicker)
-    # get the name from the reference table using the mongo client
-    ref = db.reference.find_one({"_id": selectedTicker})
-    cols[index].write(ref["details"]["name"])
-    plots[index] = cols[index].empty()
-    plots2[index] = cols[index].empty()
-
-# Previous Trading Day
-
-d2 = now.replace(hour=0, minute=0, second=0, microsecond=0)
-while df.empty:
-    d2 -= datetime.timedelta(days=1)
-    while d2.weekday() == 0:
-        d2 -= datetime.timedelta(days=1)
-    d2 = d2.replace(hour=0, minute=0, second=0, microsecond=0)
-    dd2 = nytz.localize(datetime.datetime(d2.year, d2.month, d2.day))
-    dd1 = dd2 + datetime.timedelta(days=-1)
-    df = get_stock_min(selectedTickers, dd1, dd2, "Minute")
-df = df[
-    (df["date"].dt.time >= datetime.time(9, 30))
-    & (df["date"].dt.time < datetime.time(16, 0))
-]
-cutoff_time = df["date"].max() - datetime.timedelta(days=1)
-df = df[df["date"] > cutoff_time]
-
-a = [None] * len(selectedTickers)
-for index, selectedTicker in enumerate(selectedTickers):
-    a[index] = cols[index].empty()
-
+    names[index] = cols[index].empty()
+
+LIVE_SECONDS = 2 * 60
+LIVE_INTERVAL = 2
+
+# The Day So Far bars only change within the open 5-minute bar, so they are redrawn less often than the live prices
+DAY_SO_FAR_INTERVAL = 30
+
+poller = get_poller()
+
+# The live panels rerun on their own without rerunning the page, at the rate the live scheduler admits the session
+# to. Each live chart keeps its series in the browser and is only sent the seconds that are new since its previous
+# update.
+interval = live_interval(view_interval(rt == "Real-Time", LIVE_INTERVAL))
+
+@st.fragment(run_every=interval)
+def live_prices():
+    with fragment_run("dashboard.live_prices"):
+        keep_live()
+        windows, last_timestamp = poller.poll(session_id(), selectedTickers, rt == "Real-Time", LIVE_SECONDS)
+        x_range = None
+        if last_timestamp is not None:
+            x_range = [last_timestamp - pd.Timedelta(seconds=LIVE_SECONDS), last_timestamp]
+        for index, col in enumerate(st.columns(len(selectedTickers))):
+            times, prices, valid = windows[selectedTickers[index]]
+            with col:
+                live_price(selectedTickers[index], times, prices, x_range, "Last Five Minutes" if index == 0 else "", last_timestamp, key=f"live_price_{selectedTickers[index]}_{rt}", overlays=liveIndicators)
+
+# Day So Far: 5-minute bars the poller keeps up to date from the same trades
+@st.fragment(run_every=max(DAY_SO_FAR_INTERVAL, interval or 0))
+def day_so_far():
+    with fragment_run("dashboard.day_so_far"):
+        sofar_dfs = poller.bars(selectedTickers, rt == "Real-Time", 300)
+        for index, col in enumerate(st.columns(len(selectedTickers))):
+            sofar_df = sofar_dfs[selectedTickers[index]]
+            if not sofar_df.empty:
+                col.plotly_chart(render_stock_history(selectedTickers[index], "Minute", sofar_df, "Day So Far" if index == 0 else "", chart_points, indicators))
+
+if interval is not None:
+    live_prices()
+    day_so_far()
+
+previous_day = [None] * len(selectedTickers)
+last_90_days = [None] * len(selectedTickers)
+cols = st.columns(len(selectedTickers))
 for index, selectedTicker in enumerate(selectedTickers):
-    if df.empty:
-        plots[index].write("No data available")
-    dff = df[df["ticker"] == selectedTicker]
-    fig = render_stock_history(selectedTicker, "Minute", dff, "Previous Trading Day" if index == 0 else "")
-    a[index].plotly_chart(fig)
+    previous_day[index] = cols[index].empty()
+    last_90_days[index] = cols[index].empty()
+
+for future in as_completed(futures):
+    panel = futures[future]
+
+    if panel == "reference":
+        reference = future.result()
+        for index, selectedTicker in enumerate(selectedTickers):
+            names[index].write(reference.get(selectedTicker, {}).get("name", ""))
+
+    # Previous Trading Day
+    elif panel == "previous_day":
+        day, df = future.result()
+        with span("dashboard.previous_day"):
+            for index, selectedTicker in enumerate(selectedTickers):
+                if df.empty:
+                    previous_day[index].write("No data available")
+                    continue
+                dff = df[df["ticker"] == selectedTicker]
+                fig = render_stock_history(selectedTicker, "Minute", dff, "Previous Trading Day" if index == 0 else "", chart_points, indicators)
+                with span("st.plotly_chart"):
+                    previous_day[index].plotly_chart(fig)
+
+    # Last 90 Days
+    elif panel == "last_90_days":
+        df = future.result()
+        with span("dashboard.last_90_days"):
+            for index, selectedTicker in enumerate(selectedTickers):
+                if df.empty:
+                    last_90_days[index].write("No data available")
+                    continue
+                dff = df[df["ticker"] == selectedTicker]
+                fig = render_stock_history(selectedTicker, "Day", dff, "Trading In Previous 90 Days" if index == 0 else "", chart_points, indicators)
+                with span("st.plotly_chart"):
+                    last_90_days[index].plotly_chart(fig)
+
+end()
 
 # Last 3 Weeks
 
@@ -107,105 +187,3 @@ for index, selectedTicker in enumerate(selectedTickers):
 #     dff = df[df["ticker"] == selectedTicker]
 #     fig = render_stock_history(selectedTicker, "Hour", dff, "Trading in Previous 3 Weeks" if index == 0 else "")
 #     a[index].plotly_chart(fig)
-
-# Last 90 Days
-
-d2 = now
-d2 = (d2 + datetime.timedelta(days=1)).replace(
-    hour=0, minute=0, second=0, microsecond=0
-)
-dd2 = nytz.localize(datetime.datetime(d2.year, d2.month, d2.day))
-dd1 = dd2 + datetime.timedelta(days=-90)
-df = get_stock_min(selectedTickers, dd1, dd2, "Day")
-
-a = [None] * len(selectedTickers)
-for index, selectedTicker in enumerate(selectedTickers):
-    a[index] = cols[index].empty()
-
-for index, selectedTicker in enumerate(selectedTickers):
-    if df.empty:
-        plots[index].write("No data available")
-    dff = df[df["ticker"] == selectedTicker]
-    fig = render_stock_history(selectedTicker, "Day", dff, "Trading In Previous 90 Days" if index == 0 else "")
-    a[index].plotly_chart(fig)
-
-last_timestamp = None
-
-dfs = [None] * len(selectedTickers)
-for index, selectedTicker in enumerate(selectedTickers):
-    dfs[index] = pd.DataFrame(columns=["_id", "price"])
-
-initialized = [False] * len(selectedTickers)
-
-emptyCount = 0
-while True:
-    #if rt == "Real-Time":
-    #    sofar_dfs = get_realtime_sofar(selectedTickers, True)
-    #    for index, selectedTicker in enumerate(selectedTickers):
-    #        sofar_df = sofar_dfs[selectedTicker]
-    #        fig = render_stock_history(selectedTicker, "Minute", sofar_df, "Day So Far" if index == 0 else "")
-    #        plots2[index].plotly_chart(fig)
-
-    new_dfs = get_realtime_second(selectedTickers, last_timestamp, rt == "Real-Time")
-    fullyEmpty = all([new_df.empty for new_df in new_dfs.values()])
-    max_ids = [new_df["_id"].max() for new_df in new_dfs.values() if not new_df.empty]
-    new_last_timestamp = max(max_ids) if max_ids else last_timestamp
-    written = False
-
-    for index, selectedTicker in enumerate(selectedTickers):
-        new_df = new_dfs[selectedTicker]
-
-        if len(new_df) > 0:
-            new_df = new_df[:-1]
-
-        if last_timestamp == None or new_last_timestamp > dfs[index]["_id"].max():
-            written = True
-
-            if not new_df.empty:
-                if dfs[index].empty:
-                    dfs[index] = new_df
-                else:
-                    dfs[index] = pd.concat([dfs[index], new_df], ignore_index=True)
-                    dfs[index].drop_duplicates(subset="_id", keep="last", inplace=True)
-                dfs[index] = dfs[index][
-                    dfs[index]["_id"]
-                    >= (dfs[index]["_id"].max() - pd.Timedelta(minutes=2))
-                ]
-
-            x_min = 0
-            x_max = 0
-
-            x_min = new_last_timestamp - pd.Timedelta(minutes=2)
-            x_max = new_last_timestamp
-
-            if not dfs[index].empty:
-                fig = px.line(
-                    dfs[index],
-                    x="_id",
-                    y="price",
-                    labels={
-                        "_id": "Time",
-                        "price": selectedTicker,
-                    },
-                    range_x=[x_min, x_max],
-                    height=200,
-                )
-                fig.update_xaxes(
-                    title_text=None,
-                    showticklabels=True,
-                    type="date",
-                    range=[x_min, x_max],
-                )
-                fig.update_yaxes(title_text=None, showticklabels=True)
-                fig.update_layout(
-                    title="Last Five Minutes" if index == 0 else "",
-                    margin=dict(l=0, r=20, t=20, b=20),
-                )
-                plots[index].plotly_chart(fig)
-    if fullyEmpty and rt != "Real-Time":
-        print("resetting replay")
-        dfs = [None] * len(selectedTickers)
-        last_timestamp = None
-    elif written:
-        last_timestamp = new_last_timestamp
-    time.sleep(2)
@@ -2,17 +2,382 @@ import streamlit as st
 import pandas as pd
 import pytz
 import datetime
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from lib import init_connection
+from columnar import split_by_ticker
+from querylog import aggregate
+from barcache import ResultCache, plan_fetches
+from barstore import BarStore
+from downsample import DEFAULT_POINTS, pick_aggregation_period
+from indicators import add_indicators, trim, warmup_start
+from replay import get_replay_snapshot
+from trading_calendar import previous_trading_day, session
+from tracing import attached, context, span, traced
 
-@st.cache_data(ttl=600)
-def get_stock_min(selectedTickers, d1, d2, aggregation_period):
-    client = init_connection()
-    db = client.stocks
+BAR_SCHEMA = {"ticker": "category", "date": "datetime", "open": "float", "high": "float", "low": "float", "close": "float", "volume": "int"}
+TRADE_SECOND_SCHEMA = dict(BAR_SCHEMA, count="int")
+REALTIME_SECOND_SCHEMA = {"_id": "datetime", "ticker": "category", "price": "float"}
+REALTIME_TRADE_SCHEMA = {"ticker": "category", "localTS": "datetime", "sequence_number": "int", "price": "float", "size": "int"}
+
+# Daily and hourly bars for closed days are read from rollups of stocks_min maintained by rollup.py
+ROLLUP_TABLES = {"Day": "stocks_day", "Hour": "stocks_hour"}
+
+# localDate values are compared as midnight UTC datetimes
+def local_date(d):
+    return d.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=pytz.UTC)
+
+# A value from secrets (or `default` when it is not set or there is no secrets file)
+def setting(name, default):
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+# Independent queries issued by one page run concurrently on this pool (PyMongo releases the GIL while it waits on
+# the server); it is shared by all sessions so the number of connections in use stays bounded
+QUERY_THREADS = 8
+
+@st.cache_resource
+def get_query_executor():
+    print("get_query_executor()")
+    return ThreadPoolExecutor(QUERY_THREADS, thread_name_prefix="query")
+
+# Run any data function (or lib.get_reference) on the query pool and return its Future. The calling script's run
+# context is attached to the worker thread so st.cache_data and st.cache_resource behave as on the script thread,
+# and so is its trace, so the function's spans show up in the run's timeline.
+def submit(fn, *args, **kwargs):
+    return submit_to(get_query_executor(), fn, *args, **kwargs)
+
+def submit_to(executor, fn, *args, **kwargs):
+    ctx = get_script_run_ctx()
+    trace = context()
+
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        with attached(trace):
+            return fn(*args, **kwargs)
+
+    return executor.submit(run)
+
+# How multi-ticker queries are executed. stocks_min, trades, realtime and the rollups are all SHARD KEY(ticker):
+# "combined" sends one $or over every ticker, which fans out to all leaves and merges at the coordinator;
+# "per_ticker" sends one single-partition query per ticker on the fan-out pool and merges the results here.
+# The default can be set with query_strategy in secrets (python -m bench.fanout compares the two).
+STRATEGIES = ("combined", "per_ticker")
+DEFAULT_STRATEGY = "combined"
+
+# Per-ticker queries get their own pool: they are issued from code that may itself be running on the query pool
+FANOUT_THREADS = 16
+
+@st.cache_resource
+def get_fanout_executor():
+    print("get_fanout_executor()")
+    return ThreadPoolExecutor(FANOUT_THREADS, thread_name_prefix="fanout")
+
+def default_strategy():
+    return setting("query_strategy", DEFAULT_STRATEGY)
+
+# Run query(tickers) for all selected tickers with the given strategy and return one frame sorted by `sort_by`
+def fan_out(query, selectedTickers, strategy, sort_by):
+    strategy = strategy or default_strategy()
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown query strategy {strategy!r}")
+    if strategy == "combined" or len(selectedTickers) <= 1:
+        return query(selectedTickers)
+
+    executor = get_fanout_executor()
+    futures = [submit_to(executor, query, [ticker]) for ticker in selectedTickers]
+    frames = [future.result() for future in futures]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True).sort_values(sort_by, kind="stable", ignore_index=True)
+    df["ticker"] = df["ticker"].astype("category")
+    return df
+
+def get_stock_min_async(selectedTickers, d1, d2, aggregation_period, target_points=DEFAULT_POINTS, strategy=None):
+    return submit(get_stock_min, selectedTickers, d1, d2, aggregation_period, target_points, strategy)
+
+def get_stock_min_indicators_async(selectedTickers, d1, d2, aggregation_period, indicators, target_points=DEFAULT_POINTS, strategy=None):
+    return submit(get_stock_min_indicators, selectedTickers, d1, d2, aggregation_period, indicators, target_points, strategy)
+
+def get_previous_session_async(selectedTickers, today, attempts=5, indicators=()):
+    return submit(get_previous_session, selectedTickers, today, attempts, indicators)
+
+# Segments for the current day are refreshed after TODAY_TTL seconds. Past days only stop expiring once they are
+# final (see is_final); until then they are refreshed after RECENT_TTL, as stocks_min is loaded the day after.
+TODAY_TTL = 60
+RECENT_TTL = 600
+
+# How long the rollup status is kept before it is read again (seconds)
+ROLLUP_STATUS_TTL = 60
+
+# Memory budget shared by every result cached by this process (bar segments and per-ticker trades); override with
+# cache_mb in secrets
+DEFAULT_CACHE_MB = 512
+
+@st.cache_resource
+def get_result_cache():
+    print("get_result_cache()")
+    return ResultCache(float(setting("cache_mb", DEFAULT_CACHE_MB)) * 1024 * 1024)
+
+# Memoize a data function in the result cache by its (hashable) arguments; results are shared, not copied, so
+# callers must not modify them
+def cached(ttl=None):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            cache = get_result_cache()
+            value = cache.get(fn.__name__, args)
+            if value is None:
+                value = fn(*args)
+                cache.put(fn.__name__, args, value, ttl)
+            return value
+
+        wrapper.clear = lambda: get_result_cache().clear(fn.__name__)
+        return wrapper
+
+    return decorate
+
+# Prices are float64 as returned; with compact_prices set in secrets they are cached as float32, which halves the
+# price columns at a precision (about 7 significant digits) that is plenty for charts
+PRICE_COLUMNS = ["open", "high", "low", "close", "price"]
+
+def compact(df):
+    if df.empty or not setting("compact_prices", False):
+        return df
+    columns = [column for column in PRICE_COLUMNS if column in df.columns]
+    return df.astype({column: "float32" for column in columns})
+
+# Closed days are also kept on local disk so a restart does not start from a cold cache. Set bar_store_path in
+# secrets (or BAR_STORE_PATH) to move it, or to an empty string to turn it off; bar_store_mb caps its size.
+DEFAULT_BAR_STORE_PATH = os.path.join(".cache", "bars")
+DEFAULT_BAR_STORE_MB = 1024
+
+@st.cache_resource
+def get_bar_store():
+    print("get_bar_store()")
+    path = os.environ.get("BAR_STORE_PATH", setting("bar_store_path", DEFAULT_BAR_STORE_PATH))
+    max_mb = float(setting("bar_store_mb", DEFAULT_BAR_STORE_MB))
+    return BarStore(path, max_mb * 1024 * 1024) if path else None
+
+# A past day's segment can no longer change once the day is complete (up to the last day of get_rollup_status). That
+# includes empty segments: a ticker without bars on a day the rollups cover had no trades that day (it was not
+# listed yet, or no longer).
+def is_final(day):
+    _, last = get_rollup_status()
+    return last is not None and day <= last
+
+# aggregation_period may be "Auto" to pick the finest period whose bar count over the range fits target_points;
+# the period used is recorded in df.attrs["aggregation_period"]. strategy is one of STRATEGIES (None for the default).
+@traced()
+def get_stock_min(selectedTickers, d1, d2, aggregation_period, target_points=DEFAULT_POINTS, strategy=None):
+    if aggregation_period == "Auto":
+        aggregation_period = pick_aggregation_period(d1, d2, target_points)
+
+    day1 = local_date(d1)
+    day2 = local_date(d2)
+    today = local_date(datetime.datetime.now(pytz.timezone("America/New_York")))
+    days = [day1 + datetime.timedelta(days=i) for i in range((day2 - day1).days + 1)]
+
+    cache = get_result_cache()
+    segments = []
+    missing = {}
+    for ticker in selectedTickers:
+        for day in days:
+            segment = cache.get("get_stock_min", (ticker, day, aggregation_period))
+            if segment is None:
+                missing.setdefault(ticker, []).append(day)
+            else:
+                segments.append(segment)
+
+    # Past days missing from memory are looked up on disk before the database
+    store = get_bar_store()
+    if missing and store is not None:
+        with span("data.get_stock_min.store") as record:
+            keys = [(ticker, day, aggregation_period) for ticker, ticker_days in missing.items() for day in ticker_days if day < today]
+            found = store.get_many(keys)
+            record["segments"] = len(found)
+            for key, segment in found.items():
+                segment = compact(segment)
+                cache.put("get_stock_min", key, segment)
+                segments.append(segment)
+                missing[key[0]].remove(key[1])
+            missing = {ticker: ticker_days for ticker, ticker_days in missing.items() if ticker_days}
+
+    if missing:
+        client = init_connection()
+        db = client.stocks
+
+        for tickers, start, end in plan_fetches(missing, days):
+            df = compact(fetch_stock_min(db, tickers, start, end, aggregation_period, strategy))
+            fetched = {}
+            if not df.empty:
+                segment_days = df["date"].dt.normalize().dt.tz_localize(pytz.UTC)
+                for (ticker, day), segment in df.groupby([df["ticker"], segment_days], observed=True, sort=False):
+                    fetched[(ticker, day.to_pydatetime())] = segment
+            # Days without any bars are cached too, so weekends and holidays are not queried again
+            # Only final segments are written to disk, where nothing expires
+            final = []
+            for ticker in tickers:
+                for day in missing[ticker]:
+                    if start <= day <= end:
+                        segment = fetched.get((ticker, day), df.iloc[0:0])
+                        if day >= today:
+                            ttl = TODAY_TTL
+                        elif is_final(day):
+                            ttl = None
+                            final.append(((ticker, day, aggregation_period), segment))
+                        else:
+                            ttl = RECENT_TTL
+                        cache.put("get_stock_min", (ticker, day, aggregation_period), segment, ttl)
+                        segments.append(segment)
+            if store is not None:
+                store.put_many(final)
+
+    segments = [segment for segment in segments if not segment.empty]
+    if not segments:
+        df = pd.DataFrame()
+        df.attrs["aggregation_period"] = aggregation_period
+        return df
+    # Segments come from memory, disk and the database in varying order; tickers are ordered by name within a bar
+    with span("data.get_stock_min.concat", segments=len(segments)):
+        df = pd.concat(segments, ignore_index=True)
+        df["ticker"] = df["ticker"].astype(str).astype("category")
+        df = df.sort_values(["date", "ticker"], kind="stable", ignore_index=True)
+
+        if aggregation_period == "Day":
+            df["date"] = df["date"].dt.date
+        else:
+            df["date"] = df["date"].dt.tz_localize("America/New_York")
+
+    df.attrs["aggregation_period"] = aggregation_period
+    return df
+
+# get_stock_min with the columns of `indicators` (names from indicators.INDICATORS). The range is extended back by
+# the days holding the bars the indicators need before d1, which only adds those days' segments to the fetch; the
+# bars before d1's day are dropped again once the indicators are computed.
+@traced()
+def get_stock_min_indicators(selectedTickers, d1, d2, aggregation_period, indicators, target_points=DEFAULT_POINTS, strategy=None):
+    if aggregation_period == "Auto":
+        aggregation_period = pick_aggregation_period(d1, d2, target_points)
+    day1 = pytz.timezone("America/New_York").localize(datetime.datetime.combine(d1.date(), datetime.time()))
+    df = get_stock_min(selectedTickers, warmup_start(day1, aggregation_period, indicators), d2, aggregation_period, target_points, strategy)
+    with span("data.get_stock_min_indicators.compute"):
+        df = trim(add_indicators(df, indicators, aggregation_period), day1, aggregation_period)
+    df.attrs["aggregation_period"] = aggregation_period
+    return df
+
+# Minute bars of the regular session of the most recent trading day before `today`. The calendar gives that day
+# directly; earlier sessions are only tried if it has not been ingested yet. Returns (day, df); df is empty if
+# none of the `attempts` sessions had data. The columns of `indicators` are computed over the extended hours before
+# the session is cut out, so the pre-market bars warm them up (and the day before, for a longer lookback).
+@traced()
+def get_previous_session(selectedTickers, today, attempts=5, indicators=()):
+    nytz = pytz.timezone("America/New_York")
+    day = today
+    df = pd.DataFrame()
+    for attempt in range(attempts):
+        day = previous_trading_day(day)
+        dd = nytz.localize(datetime.datetime(day.year, day.month, day.day))
+        df = get_stock_min(selectedTickers, dd, dd, "Minute")
+        if not df.empty:
+            bounds = session(day)
+            if indicators:
+                start = warmup_start(bounds.open, "Minute", indicators)
+                if start < dd:
+                    df = get_stock_min(selectedTickers, start, dd, "Minute")
+                with span("data.get_previous_session.compute"):
+                    df = add_indicators(df, indicators, "Minute")
+            df = df[(df["date"] >= bounds.open) & (df["date"] < bounds.close)]
+            break
+    return day, df
+
+# Fetch bars for an inclusive range of local dates. Closed days come from the rollup when there is one; the
+# current day is still aggregated on the fly.
+@traced()
+def fetch_stock_min(db, selectedTickers, day1, day2, aggregation_period, strategy=None):
+    return fan_out(
+        lambda tickers: fetch_stock_min_combined(db, tickers, day1, day2, aggregation_period),
+        selectedTickers,
+        strategy,
+        "date",
+    )
+
+# Only the days rollup.py has completed are read from the rollups; any others (not rolled up yet, or loaded into
+# stocks_min since) are aggregated from stocks_min
+def fetch_stock_min_combined(db, selectedTickers, day1, day2, aggregation_period):
+    first, last = get_rollup_status()
 
+    frames = []
+    if aggregation_period in ROLLUP_TABLES and first is not None and max(day1, first) <= min(day2, last):
+        start, end = max(day1, first), min(day2, last)
+        if day1 < start:
+            frames.append(aggregate_stock_min(db, selectedTickers, day1, start - datetime.timedelta(days=1), aggregation_period))
+        frames.append(read_rollup(db, selectedTickers, start, end, aggregation_period))
+        day1 = end + datetime.timedelta(days=1)
+    if day1 <= day2:
+        frames.append(aggregate_stock_min(db, selectedTickers, day1, day2, aggregation_period))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    df = pd.concat(frames, ignore_index=True)
+    df["ticker"] = df["ticker"].astype("category")
+    return df
+
+# Read pre-aggregated bars for whole days from a rollup table
+def read_rollup(db, selectedTickers, day1, day2, aggregation_period):
     pipeline = [
         {
             "$match": {
-                "localDate": {"$gte": d1.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=pytz.UTC), "$lte": d2.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=pytz.UTC)},
+                "localDate": {"$gte": day1, "$lte": day2},
+                "$or": [{"ticker": ticker} for ticker in selectedTickers],
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "ticker": 1,
+                "date": "$localDate" if aggregation_period == "Day" else "$localTS",
+                "open": 1,
+                "high": 1,
+                "low": 1,
+                "close": 1,
+                "volume": 1,
+            }
+        },
+        {"$sort": {"date": 1}},
+    ]
+
+    params = {"tickers": selectedTickers, "day1": day1, "day2": day2, "period": aggregation_period}
+    return aggregate(db[ROLLUP_TABLES[aggregation_period]], pipeline, BAR_SCHEMA, "read_rollup", params)
+
+# The days rollup.py has rolled up completely, as (first, last) localDate datetimes, or (None, None) before it first
+# ran. rollup.py only counts days up to the last one it found in stocks_min, which is loaded from daily files that
+# arrive the day after, so the days up to `last` are also fully ingested.
+def read_rollup_status(db):
+    status = db.rollup_status.find_one({"name": "stocks_min"})
+    if status is None:
+        return None, None
+    return local_date(status["firstDate"]), local_date(status["lastDate"])
+
+@cached(ttl=ROLLUP_STATUS_TTL)
+def get_rollup_status():
+    return read_rollup_status(init_connection().stocks)
+
+# Aggregate bars for whole days on the fly from stocks_min
+def aggregate_stock_min(db, selectedTickers, day1, day2, aggregation_period):
+    pipeline = [
+        {
+            "$match": {
+                "localDate": {"$gte": day1, "$lte": day2},
                 "$or": [{"ticker": ticker} for ticker in selectedTickers],
             }
         },
@@ -110,19 +475,25 @@ def get_stock_min(selectedTickers, d1, d2, aggregation_period):
 
     pipeline.append({"$sort": {"date": 1}})
 
-    df = db.stocks_min.aggregate(pipeline)
-    df = pd.DataFrame(df)
-
-    if not df.empty:
-        if aggregation_period == "Day":
-            df["date"] = df["date"].dt.date
-        else:
-            df["date"] = df["date"].dt.tz_localize("America/New_York")
+    params = {"tickers": selectedTickers, "day1": day1, "day2": day2, "period": aggregation_period}
+    return aggregate(db.stocks_min, pipeline, BAR_SCHEMA, "aggregate_stock_min", params)
 
+# Per-second trade windows are short (well under a day), so they are cached per ticker rather than per day segment:
+# adding a ticker to a request only fetches the new one
+@traced()
+def get_trades_second(selectedTickers, d1, d2):
+    frames = [get_trades_second_ticker(ticker, d1, d2) for ticker in selectedTickers]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True).sort_values("date", kind="stable", ignore_index=True)
+    df["ticker"] = df["ticker"].astype("category")
     return df
 
-@st.cache_data(ttl=600)
-def get_trades_second(selectedTickers, d1, d2):
+@traced()
+@cached(ttl=600)
+def get_trades_second_ticker(ticker, d1, d2):
+    selectedTickers = [ticker]
     client = init_connection()
     db = client.stocks
 
@@ -170,122 +541,233 @@ def get_trades_second(selectedTickers, d1, d2):
     })
     pipeline.append({"$sort": {"date": 1}})
 
-    df = db.trades.aggregate(pipeline)
-    df = pd.DataFrame(df)
+    df = aggregate(db.trades, pipeline, TRADE_SECOND_SCHEMA, "get_trades_second", {"tickers": selectedTickers, "d1": d1, "d2": d2})
 
     if not df.empty:
         df["date"] = df["date"].dt.tz_localize("America/New_York")
 
-    return df
+    return compact(df)
+
+# The realtime table only holds the current New York trading day
+def realtime_date():
+    return local_date(datetime.datetime.now(pytz.timezone("America/New_York")))
+
+# Replay mode is served from the local snapshot when one is configured (see replay.py)
+@traced()
+def get_realtime_second(selectedTickers, last, realTime, strategy=None):
+    if not realTime:
+        snapshot = get_replay_snapshot()
+        if snapshot is not None:
+            return snapshot.realtime_second(selectedTickers, last)
 
-def get_realtime_second(selectedTickers, last, realTime):
     client = init_connection()
     db = client.stocks
+    df = fan_out(lambda tickers: query_realtime_second(db, tickers, last, realTime), selectedTickers, strategy, "_id")
+    return split_by_ticker(df, selectedTickers)
+
+def query_realtime_second(db, selectedTickers, last, realTime):
 
     match_condition = {"$or": [{"ticker": ticker} for ticker in selectedTickers]}
 
     if realTime:
-        nytz = pytz.timezone("America/New_York")
-        now = nytz.localize(datetime.datetime.now())
-        match_condition["localDate"] = now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=pytz.UTC)
+        match_condition["localDate"] = realtime_date()
 
     if last is not None:
         match_condition["localTS"] = {"$gte": last}
 
     col = db.realtime if realTime else db.replay
 
-    df = col.aggregate(
-        [
-            {
-                "$match": match_condition
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "date": {"$dateTrunc": {"date": "$localTS", "unit": "second"}},
-                        "ticker": "$ticker",
-                    },
-                    "price": {"$avg": "$price"},
-                }
-            },
-            {
-                "$project": {
-                    "_id": "$_id.date",
-                    "ticker": "$_id.ticker",
-                    "price": 1,
-                }
-            },
-            {
-                "$sort": {
-                    "_id": 1
-                }
-            },
-        ]
+    pipeline = [
+        {
+            "$match": match_condition
+        },
+        {
+            "$group": {
+                "_id": {
+                    "date": {"$dateTrunc": {"date": "$localTS", "unit": "second"}},
+                    "ticker": "$ticker",
+                },
+                "price": {"$avg": "$price"},
+            }
+        },
+        {
+            "$project": {
+                "_id": "$_id.date",
+                "ticker": "$_id.ticker",
+                "price": 1,
+            }
+        },
+        {
+            "$sort": {
+                "_id": 1
+            }
+        },
+    ]
+
+    params = {"tickers": selectedTickers, "last": last, "realTime": realTime}
+    return aggregate(col, pipeline, REALTIME_SECOND_SCHEMA, "get_realtime_second", params)
+
+# Raw trades after a per-ticker watermark on the realtime sort key (localDate, ticker, localTS, sequence_number).
+# `watermarks` maps each ticker to the (localTS, sequence_number) of the last trade already seen, or None to read
+# the ticker's whole day; a sequence number of -1 includes every trade from that localTS on. Sequence numbers
+# increase per ticker, so localTS only bounds the seek (it comes back at millisecond precision) and the sequence
+# number decides which trades are new. Returns {ticker: df} with the columns of REALTIME_TRADE_SCHEMA in
+# (localTS, sequence_number) order.
+@traced()
+def get_realtime_trades(watermarks, realTime, strategy=None):
+    selectedTickers = list(watermarks)
+    if not realTime:
+        snapshot = get_replay_snapshot()
+        if snapshot is not None:
+            return snapshot.realtime_trades(watermarks)
+
+    client = init_connection()
+    db = client.stocks
+    df = fan_out(
+        lambda tickers: query_realtime_trades(db, {ticker: watermarks[ticker] for ticker in tickers}, realTime),
+        selectedTickers,
+        strategy,
+        ["localTS", "sequence_number"],
     )
+    return split_by_ticker(df, selectedTickers)
 
-    df = pd.DataFrame(df)
-    if not df.empty:
-        df = {ticker: df[df["ticker"] == ticker] for ticker in selectedTickers}
-    else :
-        df = {ticker: pd.DataFrame() for ticker in selectedTickers}
-    return df
+def query_realtime_trades(db, watermarks, realTime):
+    conditions = []
+    for ticker, watermark in watermarks.items():
+        if watermark is None:
+            conditions.append({"ticker": ticker})
+        else:
+            localTS, sequence_number = watermark
+            localTS = pd.Timestamp(localTS).floor("ms").to_pydatetime().replace(tzinfo=pytz.UTC)
+            conditions.append({"ticker": ticker, "localTS": {"$gte": localTS}, "sequence_number": {"$gt": sequence_number}})
+
+    match_condition = {"$or": conditions}
+    if realTime:
+        match_condition["localDate"] = realtime_date()
+
+    col = db.realtime if realTime else db.replay
+
+    pipeline = [
+        {
+            "$match": match_condition
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "ticker": 1,
+                "localTS": 1,
+                "sequence_number": 1,
+                "price": 1,
+                "size": 1,
+            }
+        },
+        {
+            "$sort": {
+                "localTS": 1,
+                "sequence_number": 1,
+            }
+        },
+    ]
+
+    params = {"watermarks": watermarks, "realTime": realTime}
+    return aggregate(col, pipeline, REALTIME_TRADE_SCHEMA, "get_realtime_trades", params)
+
+# The time of the newest trade for any of the tickers, or None if there are none (the day rolled over or the
+# replay table was truncated)
+@traced()
+def get_realtime_latest(selectedTickers, realTime):
+    if not realTime:
+        snapshot = get_replay_snapshot()
+        if snapshot is not None:
+            return snapshot.realtime_latest(selectedTickers)
+
+    client = init_connection()
+    db = client.stocks
+
+    match_condition = {"$or": [{"ticker": ticker} for ticker in selectedTickers]}
+    if realTime:
+        match_condition["localDate"] = realtime_date()
+
+    col = db.realtime if realTime else db.replay
+
+    pipeline = [
+        {
+            "$match": match_condition
+        },
+        {
+            "$group": {
+                "_id": None,
+                "localTS": {"$max": "$localTS"},
+            }
+        },
+    ]
+
+    params = {"tickers": selectedTickers, "realTime": realTime}
+    df = aggregate(col, pipeline, {"localTS": "datetime"}, "get_realtime_latest", params)
+    if df.empty or pd.isna(df["localTS"].iat[0]):
+        return None
+    return df["localTS"].iat[0]
+
+# Bars of `bucket_minutes` over every trade of the day so far. The dashboard reads the bars the poller builds
+# incrementally from this starting point (see bars.py) rather than calling it on every tick.
+@traced()
+def get_realtime_sofar(selectedTickers, realTime, strategy=None, bucket_minutes=5):
+    if not realTime:
+        snapshot = get_replay_snapshot()
+        if snapshot is not None:
+            return snapshot.realtime_sofar(selectedTickers, bucket_minutes=bucket_minutes)
 
-def get_realtime_sofar(selectedTickers, realTime):
     client = init_connection()
     db = client.stocks
+    df = fan_out(lambda tickers: query_realtime_sofar(db, tickers, realTime, bucket_minutes), selectedTickers, strategy, "date")
+    return split_by_ticker(df, selectedTickers)
+
+def query_realtime_sofar(db, selectedTickers, realTime, bucket_minutes=5):
 
     match_condition = {"$or": [{"ticker": ticker} for ticker in selectedTickers]}
 
     if realTime:
-        nytz = pytz.timezone("America/New_York")
-        now = nytz.localize(datetime.datetime.now())
-        match_condition["localDate"] = now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=pytz.UTC)
+        match_condition["localDate"] = realtime_date()
 
     col = db.realtime if realTime else db.replay
 
-    df = col.aggregate(
-        [
-            {
-                "$match": match_condition
-            },
-            {
-                "$group": {
-                    "_id": {
-                        "bucket": {"$floor":{"$divide": ["$timestamp", 5 * 60 * 1000]}},
-                        "ticker": "$ticker",
-                    },
-                    "date": {"$min": "$localTS"},
-                    "open": {"$first": "$price"},
-                    "high": {"$max": "$price"},
-                    "low": {"$min": "$price"},
-                    "close": {"$last": "$price"},
-                    "volume": {"$sum": "$size"},
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "ticker": "$_id.ticker",
-                    "date":1,
-                    "volume": 1,
-                    "open": 1,
-                    "high": 1,
-                    "low": 1,
-                    "close": 1,
-                    "count": 1,
-                }
-            },
-            {
-                "$sort": {
-                    "date": 1
-                }
+    pipeline = [
+        {
+            "$match": match_condition
+        },
+        {
+            "$group": {
+                "_id": {
+                    "bucket": {"$floor":{"$divide": ["$timestamp", bucket_minutes * 60 * 1000]}},
+                    "ticker": "$ticker",
+                },
+                "date": {"$min": "$localTS"},
+                "open": {"$first": "$price"},
+                "high": {"$max": "$price"},
+                "low": {"$min": "$price"},
+                "close": {"$last": "$price"},
+                "volume": {"$sum": "$size"},
             }
-        ]
-    )
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "ticker": "$_id.ticker",
+                "date":1,
+                "volume": 1,
+                "open": 1,
+                "high": 1,
+                "low": 1,
+                "close": 1,
+                "count": 1,
+            }
+        },
+        {
+            "$sort": {
+                "date": 1
+            }
+        }
+    ]
 
-    df = pd.DataFrame(df)
-    if not df.empty:
-        df = {ticker: df[df["ticker"] == ticker] for ticker in selectedTickers}
-    else :
-        df = {ticker: pd.DataFrame() for ticker in selectedTickers}
-    return df
\ No newline at end of file
+    params = {"tickers": selectedTickers, "realTime": realTime, "bucket_minutes": bucket_minutes}
+    return aggregate(col, pipeline, BAR_SCHEMA, "get_realtime_sofar", params)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import streamlit as st
+import pandas as pd
+from streamlit.runtime.caching import get_data_cache_stats_provider
+
+from data import get_result_cache
+from lib import init_nav
+from tracing import get_tracer, render_timeline
+from querylog import get_query_log, slow_query_ms
+
+title = "Diagnostics"
+
+st.set_page_config(
+    page_title=title,
+    layout="wide",
+)
+
+init_nav()
+
+st.title(title)
+
+st.markdown(
+    """
+    ## Caches
+    Results of the data functions held by this process under a shared memory budget (cache_mb in secrets), with
+    their entries, DataFrame memory and hit rate. The least recently used entries are evicted first.
+    """
+)
+
+cache = get_result_cache()
+caches = pd.DataFrame(cache.stats(), columns=["function", "entries", "bytes", "hits", "misses"])
+caches["hit %"] = (100 * caches["hits"] / (caches["hits"] + caches["misses"]).where(lambda n: n > 0)).round(1)
+st.caption(f"{cache.bytes / 1e6:,.1f} MB of {cache.max_bytes / 1e6:,.0f} MB in {len(cache):,} entries")
+st.dataframe(caches, width="stretch", hide_index=True)
+
+# Streamlit's own st.cache_data caches (reference data, ticker list); their size is reported by Streamlit, hit
+# rates are not. Older versions return a list of stats, newer ones a list per stat family.
+streamlit_stats = get_data_cache_stats_provider().get_stats()
+if isinstance(streamlit_stats, dict):
+    streamlit_stats = [stat for stats in streamlit_stats.values() for stat in stats]
+if streamlit_stats:
+    st.dataframe(
+        pd.DataFrame([{"function": stat.cache_name, "bytes": stat.byte_length} for stat in streamlit_stats])
+        .groupby("function", as_index=False)
+        .sum(),
+        width="stretch",
+        hide_index=True,
+    )
+
+if st.button("Clear caches"):
+    cache.clear()
+    st.rerun()
+
+st.markdown(
+    """
+    ## Spans
+    Durations of the traced data functions, chart rendering, queries and page sections over their most recent
+    runs, and the timelines of the most recent page and fragment runs. Add ?trace=1 to a page's URL to see the
+    timeline of each of its runs on the page itself.
+    """
+)
+
+tracer = get_tracer()
+spans = pd.DataFrame(tracer.percentiles())
+if spans.empty:
+    st.write("No spans recorded yet.")
+else:
+    st.dataframe(spans, width="stretch", hide_index=True)
+    traces = tracer.traces()[::-1]
+    choice = st.selectbox(
+        "Run",
+        range(len(traces)),
+        format_func=lambda i: f"{traces[i].time:%H:%M:%S} {traces[i].name} {traces[i].ms:.0f} ms",
+    )
+    if choice is not None:
+        st.plotly_chart(render_timeline(traces[choice]))
+    st.download_button("Prometheus metrics", tracer.prometheus(), "metrics.prom", "text/plain")
+
+st.markdown(
+    f"""
+    ## Query Log
+    Every aggregation issued by this Streamlit process, most recent first. Round-trip time is measured by the client
+    over the aggregate command and its getMores, so it includes the network; total time also includes decoding the
+    result. Queries slower than {slow_query_ms():.0f} ms have their explain output captured.
+    """
+)
+
+log = get_query_log()
+df = pd.DataFrame(log.records())
+
+if st.button("Clear log"):
+    log.clear()
+    st.rerun()
+
+if df.empty:
+    st.write("No queries recorded yet.")
+    st.stop()
+
+functions = sorted(df["function"].unique())
+selected = st.multiselect("Functions", functions, functions)
+df = df[df["function"].isin(selected)]
+
+st.markdown("### Percentiles per function")
+percentiles = df.groupby("function")[["total_ms", "roundtrip_ms", "docs", "decoded_bytes"]].quantile([0.5, 0.9, 0.99])
+percentiles = percentiles.unstack()
+percentiles.columns = [f"{metric} p{round(q * 100)}" for metric, q in percentiles.columns]
+percentiles.insert(0, "queries", df.groupby("function").size())
+st.dataframe(percentiles, width="stretch")
+
+st.markdown("### Queries")
+st.dataframe(
+    df.drop(columns=["explain"]).assign(explained=df["explain"].notna()).iloc[::-1],
+    width="stretch",
+    hide_index=True,
+)
+
+slow = df[df["explain"].notna()].iloc[::-1]
+if not slow.empty:
+    st.markdown("### Explain plans of slow queries")
+    choice = st.selectbox(
+        "Query",
+        slow.index,
+        format_func=lambda i: f"{slow.at[i, 'time']:%H:%M:%S} {slow.at[i, 'function']} {slow.at[i, 'total_ms']:.0f} ms",
+    )
+    st.caption(f"{slow.at[choice, 'shape']} — {slow.at[choice, 'params']}")
+    st.json(slow.at[choice, "explain"], expanded=False)
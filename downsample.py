@@ -0,0 +1,46 @@
+import numpy as np
+
+from trading_calendar import trading_days
+
+# Bars per trading day for each aggregation period (stocks_min covers the extended 4:00-20:00 session)
+BARS_PER_DAY = {"Minute": 16 * 12, "Hour": 16, "Day": 1}
+
+# Horizontal pixels given to each candle or line vertex when turning a chart width into a point budget
+PIXELS_PER_POINT = 2
+
+# Point budget used when the caller does not know the chart width
+DEFAULT_POINTS = 400
+
+
+def points_for_width(width):
+    return max(3, int(width) // PIXELS_PER_POINT)
+
+
+# The finest aggregation period whose bar count over the range still fits the point budget
+def pick_aggregation_period(d1, d2, target_points):
+    days = max(1, len(trading_days(d1.date(), d2.date())))
+    for aggregation_period in ("Minute", "Hour", "Day"):
+        if days * BARS_PER_DAY[aggregation_period] <= target_points:
+            return aggregation_period
+    return "Day"
+
+
+# Merge consecutive bars into at most `n` buckets, keeping the true open, high, low, close and total volume of each.
+# Any other columns (indicators) take the value at each bucket's last bar, like the close.
+def ohlc_buckets(df, n):
+    length = len(df)
+    if n >= length or n < 1:
+        return df
+
+    starts = np.unique(np.linspace(0, length, n + 1).astype(np.int64)[:-1])
+    ends = np.append(starts[1:], length)
+
+    bucketed = df.iloc[starts][["ticker", "date"]].reset_index(drop=True)
+    bucketed["open"] = df["open"].to_numpy()[starts]
+    bucketed["high"] = np.maximum.reduceat(df["high"].to_numpy(), starts)
+    bucketed["low"] = np.minimum.reduceat(df["low"].to_numpy(), starts)
+    bucketed["close"] = df["close"].to_numpy()[ends - 1]
+    bucketed["volume"] = np.add.reduceat(df["volume"].to_numpy(), starts)
+    for column in df.columns.difference(bucketed.columns, sort=False):
+        bucketed[column] = df[column].to_numpy()[ends - 1]
+    return bucketed
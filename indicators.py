@@ -0,0 +1,266 @@
+import datetime
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from downsample import BARS_PER_DAY
+from trading_calendar import nytz, previous_trading_day, session
+
+SMA_PERIOD = 20
+EMA_PERIOD = 20
+BOLLINGER_PERIOD = 20
+BOLLINGER_WIDTH = 2
+RSI_PERIOD = 14
+
+# The indicators offered on the charts and the columns each adds to a bar frame
+INDICATORS = {
+    "SMA 20": ["sma"],
+    "EMA 20": ["ema"],
+    "Bollinger 20, 2": ["bb_upper", "bb_lower"],
+    "VWAP": ["vwap"],
+    "RSI 14": ["rsi"],
+}
+INDICATOR_COLUMNS = [column for columns in INDICATORS.values() for column in columns]
+
+# The indicators that only need prices, which can also be drawn on the live per-second lines
+PRICE_INDICATORS = ["SMA 20", "EMA 20", "Bollinger 20, 2"]
+
+# Bars of history each indicator needs before its values settle. The exponentially smoothed ones (EMA, and RSI with
+# Wilder's smoothing) are given three periods; VWAP starts over every session.
+LOOKBACK = {
+    "SMA 20": SMA_PERIOD,
+    "EMA 20": 3 * EMA_PERIOD,
+    "Bollinger 20, 2": BOLLINGER_PERIOD,
+    "VWAP": 0,
+    "RSI 14": 3 * RSI_PERIOD,
+}
+
+# Length of the intraday bars (see chart.PERIOD_STEPS)
+BAR_MINUTES = {"Minute": 5, "Hour": 60}
+
+
+def lookback(names):
+    return max((LOOKBACK[name] for name in names), default=0)
+
+
+# Midnight of the first day to fetch so the bars before `d1` cover the lookback of the indicators: `d1`'s own day
+# when its earlier bars are enough (the pre-market bars before an intraday start), else as many trading days
+# before it as the lookback takes
+def warmup_start(d1, aggregation_period, names):
+    bars = lookback(names)
+    day = d1.date()
+    if aggregation_period != "Day":
+        bounds = session(day)
+        if bounds is not None and d1 > bounds.pre_open:
+            bars -= int((d1 - bounds.pre_open).total_seconds() // (BAR_MINUTES[aggregation_period] * 60))
+    for _ in range(math.ceil(max(0, bars) / BARS_PER_DAY[aggregation_period])):
+        day = previous_trading_day(day)
+    return nytz.localize(datetime.datetime.combine(day, datetime.time()))
+
+
+# The bars from `d1` on, dropping the warm-up bars fetched before it
+def trim(df, d1, aggregation_period):
+    if df.empty:
+        return df
+    start = d1.date() if aggregation_period == "Day" else d1
+    trimmed = df[df["date"] >= start].reset_index(drop=True)
+    trimmed.attrs = df.attrs
+    return trimmed
+
+
+def sma(values, n):
+    return pd.Series(values).rolling(n).mean().to_numpy()
+
+
+def ema(values, n):
+    return pd.Series(values).ewm(span=n, adjust=False).mean().to_numpy()
+
+
+# (upper, lower) bands `width` population standard deviations around the n-bar mean
+def bollinger(values, n, width):
+    rolling = pd.Series(values).rolling(n)
+    mean = rolling.mean().to_numpy()
+    deviation = rolling.std(ddof=0).to_numpy()
+    return mean + width * deviation, mean - width * deviation
+
+
+# Wilder's RSI: exponentially smoothed gains and losses with alpha 1/n, seeded with the first change
+def rsi(values, n):
+    changes = np.diff(np.asarray(values, dtype=np.float64))
+    gains = pd.Series(np.maximum(changes, 0)).ewm(alpha=1 / n, adjust=False).mean().to_numpy()
+    losses = pd.Series(np.maximum(-changes, 0)).ewm(alpha=1 / n, adjust=False).mean().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(losses == 0, 100.0, 100 - 100 / (1 + gains / losses))
+    return np.r_[np.nan, values]
+
+
+# Volume-weighted average of the typical price (high + low + close) / 3, starting over each day in `days`
+def vwap(high, low, close, volume, days):
+    weighted = pd.Series((high + low + close) / 3 * volume)
+    volume = pd.Series(volume, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (weighted.groupby(days).cumsum() / volume.groupby(days).cumsum()).to_numpy()
+
+
+# The columns of the indicators over one ticker's bars in date order
+def compute(bars, names, aggregation_period):
+    close = bars["close"].to_numpy(np.float64)
+    columns = {}
+    if "SMA 20" in names:
+        columns["sma"] = sma(close, SMA_PERIOD)
+    if "EMA 20" in names:
+        columns["ema"] = ema(close, EMA_PERIOD)
+    if "Bollinger 20, 2" in names:
+        columns["bb_upper"], columns["bb_lower"] = bollinger(close, BOLLINGER_PERIOD, BOLLINGER_WIDTH)
+    if "VWAP" in names:
+        # VWAP starts over every session, which daily bars do not show
+        if aggregation_period == "Day":
+            columns["vwap"] = np.full(len(close), np.nan)
+        else:
+            high = bars["high"].to_numpy(np.float64)
+            low = bars["low"].to_numpy(np.float64)
+            volume = bars["volume"].to_numpy(np.float64)
+            columns["vwap"] = vwap(high, low, close, volume, pd.to_datetime(bars["date"]).dt.date.to_numpy())
+    if "RSI 14" in names:
+        columns["rsi"] = rsi(close, RSI_PERIOD)
+    return columns
+
+
+# Add the columns of the indicators to a frame of bars as returned by get_stock_min (any number of tickers, in date
+# order), computed per ticker over whole columns at a time
+def add_indicators(df, names, aggregation_period):
+    if df.empty or not names:
+        return df
+    columns = {}
+    for ticker, index in df.groupby("ticker", observed=True).indices.items():
+        for column, values in compute(df.iloc[index], names, aggregation_period).items():
+            columns.setdefault(column, np.full(len(df), np.nan))[index] = values
+    return df.assign(**columns)
+
+
+# The incremental counterparts of the functions above, for series that grow one bar at a time: update() adds a
+# completed bar in O(1) and returns the indicator's value after it; peek() returns the value the open bar would give
+# without adding it.
+class RollingStats:
+    def __init__(self, n):
+        self.n = n
+        self._values = deque()
+        self._sum = 0.0
+        self._squares = 0.0
+
+    def update(self, value):
+        self._values.append(value)
+        self._sum += value
+        self._squares += value * value
+        if len(self._values) > self.n:
+            dropped = self._values.popleft()
+            self._sum -= dropped
+            self._squares -= dropped * dropped
+        return self._stats(self._sum, self._squares, len(self._values))
+
+    def peek(self, value):
+        total, squares, count = self._sum + value, self._squares + value * value, len(self._values) + 1
+        if count > self.n:
+            total -= self._values[0]
+            squares -= self._values[0] * self._values[0]
+            count -= 1
+        return self._stats(total, squares, count)
+
+    # (mean, population standard deviation), NaN until the window is full
+    def _stats(self, total, squares, count):
+        if count < self.n:
+            return np.nan, np.nan
+        mean = total / count
+        return mean, math.sqrt(max(0.0, squares / count - mean * mean))
+
+
+class Ema:
+    def __init__(self, n=None, alpha=None):
+        self.alpha = alpha if alpha is not None else 2 / (n + 1)
+        self.value = None
+
+    def update(self, value):
+        self.value = self.peek(value)
+        return self.value
+
+    def peek(self, value):
+        return value if self.value is None else self.value + self.alpha * (value - self.value)
+
+
+class Rsi:
+    def __init__(self, n):
+        self._previous = None
+        self._gains = Ema(alpha=1 / n)
+        self._losses = Ema(alpha=1 / n)
+
+    def update(self, close):
+        if self._previous is None:
+            self._previous = close
+            return np.nan
+        change = close - self._previous
+        self._previous = close
+        return self._rsi(self._gains.update(max(change, 0)), self._losses.update(max(-change, 0)))
+
+    def peek(self, close):
+        if self._previous is None:
+            return np.nan
+        change = close - self._previous
+        return self._rsi(self._gains.peek(max(change, 0)), self._losses.peek(max(-change, 0)))
+
+    def _rsi(self, gain, loss):
+        return 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+
+
+class Vwap:
+    def __init__(self):
+        self._day = None
+        self._weighted = 0.0
+        self._volume = 0.0
+
+    def update(self, day, typical, volume):
+        if day != self._day:
+            self._day, self._weighted, self._volume = day, 0.0, 0.0
+        self._weighted += typical * volume
+        self._volume += volume
+        return self._weighted / self._volume if self._volume else np.nan
+
+    def peek(self, day, typical, volume):
+        weighted, total = (0.0, 0.0) if day != self._day else (self._weighted, self._volume)
+        weighted += typical * volume
+        total += volume
+        return weighted / total if total else np.nan
+
+
+# Every indicator of one growing series of bars. Bars are (date, open, high, low, close, volume) with dates in epoch
+# seconds of New York wall-clock time, as built by bars.BarBuilder; the values come back as {column: value}.
+class IndicatorState:
+    def __init__(self):
+        self._sma = RollingStats(SMA_PERIOD)
+        self._bollinger = RollingStats(BOLLINGER_PERIOD) if BOLLINGER_PERIOD != SMA_PERIOD else self._sma
+        self._ema = Ema(EMA_PERIOD)
+        self._rsi = Rsi(RSI_PERIOD)
+        self._vwap = Vwap()
+
+    def update(self, bar):
+        return self._values(bar, "update")
+
+    def peek(self, bar):
+        return self._values(bar, "peek")
+
+    def _values(self, bar, method):
+        date, _, high, low, close, volume = bar
+        mean, deviation = getattr(self._sma, method)(close)
+        if self._bollinger is not self._sma:
+            band_mean, band_deviation = getattr(self._bollinger, method)(close)
+        else:
+            band_mean, band_deviation = mean, deviation
+        return {
+            "sma": mean,
+            "ema": getattr(self._ema, method)(close),
+            "bb_upper": band_mean + BOLLINGER_WIDTH * band_deviation,
+            "bb_lower": band_mean - BOLLINGER_WIDTH * band_deviation,
+            "vwap": getattr(self._vwap, method)(int(date) // 86400, (high + low + close) / 3, volume),
+            "rsi": getattr(self._rsi, method)(close),
+        }
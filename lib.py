@@ -1,8 +1,11 @@
+import os
 import streamlit as st
 import pandas as pd
 import pymongo
 import streamlit.components.v1 as components
 
+from querylog import RoundTripListener
+
 # Render a mermaid diagram
 def mermaid(code: str, height:int) -> None:
     components.html(
@@ -35,20 +38,38 @@ def mermaid(code: str, height:int) -> None:
 
 # This application uses the MongoDB client for interacting with SingleStore.
 # SingleStore also supports MySQL client drivers.
+# The SINGLESTORE_KAI_URI environment variable overrides the secret (the offline benchmarks point it at a local stand-in).
 @st.cache_resource
 def init_connection():
     print("init_connection()")
-    return pymongo.MongoClient(st.secrets["singlestore_kai_uri"])
+    uri = os.environ.get("SINGLESTORE_KAI_URI") or st.secrets["singlestore_kai_uri"]
+    return pymongo.MongoClient(uri, event_listeners=[RoundTripListener()])
 
-# Refresh the list of possible stock tickers each day
-@st.cache_data(ttl="1d",show_spinner=False)
+# Refresh the list of possible stock tickers each day. The catalog is maintained by rollup.py with each ticker's
+# first and last trading date; until it has been built, the tickers with reference data are listed instead.
+@st.cache_data(ttl="1d",show_spinner=False, max_entries=1)
 def get_tickers():
     print("get_tickers()")
     client = init_connection()
     db=client.stocks
-    pipeline = [{"$group": {"_id": "$ticker"}}, {"$sort": {"_id": 1}}]
-    tickersCursor = db.stocks_min.aggregate(pipeline)
-    return pd.DataFrame(tickersCursor)
+    df = pd.DataFrame(db.ticker_catalog.find({}, {"_id": 0, "ticker": 1, "firstDate": 1, "lastDate": 1}).sort("ticker", 1))
+    if df.empty:
+        df = pd.DataFrame({"ticker": [doc["_id"] for doc in db.reference.find({}, {"_id": 1}).sort("_id", 1)]})
+    return df
+
+# Small reference fields for any set of tickers in one projected query, refreshed each day like the ticker list.
+# Returns {ticker: {"name": ..., "primary_exchange": ..., "market_cap": ..., "list_date": ...}}; tickers without a
+# reference document are left out.
+@st.cache_data(ttl="1d", show_spinner=False, max_entries=128)
+def get_reference(tickers):
+    print("get_reference()")
+    client = init_connection()
+    db = client.stocks
+    cursor = db.reference.find(
+        {"_id": {"$in": list(tickers)}},
+        {"details.name": 1, "details.primary_exchange": 1, "details.market_cap": 1, "details.list_date": 1},
+    )
+    return {doc["_id"]: doc.get("details", {}) for doc in cursor}
 
 # Common navigation
 def init_nav():
@@ -56,6 +77,7 @@ def init_nav():
     st.sidebar.page_link("app.py", label="🙋 Welcome")
     st.sidebar.page_link("pages/demoarchitecture.py", label="🏗️ Demo Architecture")
     st.sidebar.page_link("pages/dashboard.py", label="📈 Dashboard")
+    st.sidebar.page_link("pages/diagnostics.py", label="🩺 Diagnostics")
     st.sidebar.page_link("https://www.singlestore.com", label="🔗 Learn More @ SingleStore.com")
 
 # Warm the cache of tickers and the database connection (called at bottom of initial page)
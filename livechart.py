@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+
+from indicators import INDICATORS, IndicatorState
+from tracing import traced
+
+_component = components.declare_component(
+    "live_price", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "live_price")
+)
+
+
+# What one browser chart holds: the number of the last update sent to it and the newest second in that update.
+# Each update carries only the seconds from that one on (it is provisional, so it is sent again), or the whole
+# window when the chart has nothing yet, asks for a resync, or the series went back in time (the poller reset or
+# replay restarted). The values of the overlaid indicators are sent along with the seconds; they are updated one
+# second at a time as seconds stop being provisional, and the provisional second's are computed without keeping it.
+class LiveSeries:
+    def __init__(self):
+        self.seq = None
+        self.until = None
+        self.resync = None
+        self.overlays = []
+        self._indicators = IndicatorState()
+
+    # The update for the current window of the ticker's ring buffer (times as datetime64, NaN for empty seconds).
+    # `resync` is the chart's component value, which the browser changes when it needs the whole window.
+    # `overlays` are names from indicators.PRICE_INDICATORS; changing them also sends the whole window.
+    def update(self, times, prices, resync=None, overlays=()):
+        valid = ~np.isnan(prices)
+        times, prices = times[valid], prices[valid]
+        rewound = self.until is not None and len(times) and times[-1] < self.until
+        if self.seq is None or resync != self.resync or rewound or list(overlays) != self.overlays:
+            base = None
+            self.seq = (self.seq or 0) + 1
+            self.resync = resync
+            self.overlays = list(overlays)
+            self._indicators = IndicatorState()
+            self.until = times[-1] if len(times) else None
+        else:
+            base = self.seq
+            if self.until is not None:
+                new = times >= self.until
+                times, prices = times[new], prices[new]
+            if len(times):
+                self.seq += 1
+                self.until = times[-1]
+        x = to_epoch_ms(times)
+        return {"seq": self.seq, "base": base, "x": x.tolist(), "y": prices.tolist(), "overlays": self._overlay(x, prices)}
+
+    # {column: values} of the overlays at the seconds sent; every second but the last (provisional) one is final
+    def _overlay(self, x, prices):
+        columns = [column for name in self.overlays for column in INDICATORS[name]]
+        values = {column: [] for column in columns}
+        if not columns:
+            return values
+        last = len(x) - 1
+        for index, (ms, price) in enumerate(zip(x.tolist(), prices.tolist())):
+            bar = (ms // 1000, price, price, price, price, 0)
+            point = self._indicators.update(bar) if index < last else self._indicators.peek(bar)
+            for column in columns:
+                values[column].append(None if np.isnan(point[column]) else point[column])
+        return values
+
+
+# Naive (wall-clock) times as epoch milliseconds, which Plotly's date axis shows unchanged
+def to_epoch_ms(times):
+    return np.asarray(times).astype("datetime64[ms]").astype(np.int64)
+
+
+# Per-second average price line for the live views. Unlike plotly_chart, which sends the whole figure every time,
+# the series stays in the browser and each call only sends the seconds that are new since the previous call, so
+# the cost of a tick (serialization, websocket payload, browser update) follows the new points rather than the
+# window. `key` identifies the chart across reruns; a chart whose series changes meaning (another ticker or mode)
+# needs another key. Points at or after `provisional` are drawn hollow. `overlays` (see LiveSeries.update) are
+# drawn as dashed lines over the price.
+@traced()
+def live_price(ticker, times, prices, x_range, title, provisional=None, key=None, height=200, overlays=()):
+    key = key or f"live_price_{ticker}"
+    series = st.session_state.setdefault(f"{key}_series", LiveSeries())
+    update = series.update(times, prices, st.session_state.get(key), overlays)
+    _component(
+        ticker=ticker,
+        title=title,
+        range=None if x_range is None else [int(pd.Timestamp(x).value // 1_000_000) for x in x_range],
+        provisional=None if provisional is None else int(pd.Timestamp(provisional).value // 1_000_000),
+        height=height,
+        key=key,
+        default=None,
+        **update,
+    )
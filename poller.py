@@ -0,0 +1,221 @@
+import threading
+import time
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from bars import BAR_SECONDS, BarBuilder
+from data import get_realtime_latest, get_realtime_second, get_realtime_sofar, get_realtime_trades
+from refresh import RefreshPolicy
+from ringbuffer import PriceRing, fold_seconds, to_epoch_seconds
+
+# How much per-second history is kept for each ticker
+WINDOW = pd.Timedelta(minutes=5)
+WINDOW_SECONDS = int(WINDOW.total_seconds())
+
+# Sessions that stop renewing their subscription (closed tab, navigated away) are dropped after this many seconds
+SUBSCRIPTION_TIMEOUT = 30
+
+
+# A single background thread per Streamlit process that polls the realtime (or replay) table for the union of
+# tickers subscribed by all sessions and keeps a per-ticker window that every session reads from. The number of
+# queries per tick depends on the number of distinct modes being watched, not on the number of viewers.
+#
+# A ticker's window is backfilled once from per-second aggregates when it joins; after that each tick only reads
+# the raw trades after the ticker's (localTS, sequence_number) watermark and folds them into the window here. The
+# newest second keeps its running sum and count so later trades in the same second update it: it is provisional
+# until a later second arrives. The same trades also extend each ticker's intraday bars (see bars.py), which are
+# seeded once from the database when the ticker joins.
+class RealtimePoller:
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._series = {True: {}, False: {}}
+        self._watermarks = {True: {}, False: {}}
+        self._open = {True: {}, False: {}}
+        self._bars = {True: {}, False: {}}
+        self._last = {True: None, False: None}
+        self._policy = RefreshPolicy()
+        self._thread = threading.Thread(target=self._run, name="realtime-poller", daemon=True)
+        self._thread.start()
+
+    # Register (or renew) the tickers a session is watching and return the current per-ticker windows along
+    # with the newest second seen, so the caller can tell whether anything changed since its previous call. Points
+    # at that second are provisional. Each window is a (times, prices, valid) copy of the most recent `seconds` of
+    # the ticker's ring buffer.
+    def poll(self, session_id, tickers, realTime, seconds=None):
+        with self._lock:
+            self._subscriptions[session_id] = (frozenset(tickers), realTime, time.monotonic())
+            series = self._series[realTime]
+            windows = {}
+            for ticker in tickers:
+                ring = series.get(ticker)
+                windows[ticker] = tuple(a.copy() for a in ring.window(seconds)) if ring is not None else _EMPTY_WINDOW
+            return windows, self._last[realTime]
+
+    # The intraday bars of `seconds` length built so far for each ticker, with the columns of get_stock_min; the
+    # last bar is still open. Tickers are only built while some session is subscribed to them through poll().
+    def bars(self, tickers, realTime, seconds=300):
+        with self._lock:
+            frames = {}
+            for ticker in tickers:
+                builders = self._bars[realTime].get(ticker)
+                frames[ticker] = builders[seconds].frame() if builders else pd.DataFrame()
+            return frames
+
+    def unsubscribe(self, session_id):
+        with self._lock:
+            self._subscriptions.pop(session_id, None)
+
+    def _subscribed(self):
+        now = time.monotonic()
+        subscribed = {True: set(), False: set()}
+        with self._lock:
+            for session_id, (tickers, realTime, seen) in list(self._subscriptions.items()):
+                if now - seen > SUBSCRIPTION_TIMEOUT:
+                    del self._subscriptions[session_id]
+                else:
+                    subscribed[realTime] |= tickers
+            for realTime, tickers in subscribed.items():
+                for state in (self._series, self._watermarks, self._open, self._bars):
+                    for ticker in list(state[realTime]):
+                        if ticker not in tickers:
+                            del state[realTime][ticker]
+                # Nothing is polled while a mode has no subscribers, so its newest second goes stale; the next
+                # ticker to join is anchored at the newest trade instead
+                if not tickers:
+                    self._last[realTime] = None
+        return subscribed
+
+    # Each ticker is polled when the refresh policy says it is due (see refresh.py); the due tickers of a mode are
+    # read in one query. Newly subscribed tickers are always due.
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            for realTime, tickers in self._subscribed().items():
+                self._policy.retain(realTime, tickers)
+                due = self._policy.due(realTime, sorted(tickers), started)
+                if not due:
+                    continue
+                try:
+                    trades = self._tick(due, realTime)
+                except Exception as e:
+                    print(f"realtime poller: {e}")
+                    trades = {ticker: 0 for ticker in due}
+                for ticker, count in trades.items():
+                    self._policy.observe(realTime, ticker, count, started)
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    # Poll the tickers and return the number of new trades of each; nothing after a reset, so every ticker is due
+    # again right away for its backfill
+    def _tick(self, tickers, realTime):
+        watermarks = self._watermarks[realTime]
+        joined = [ticker for ticker in tickers if ticker not in watermarks]
+        if joined:
+            self._backfill(joined, realTime)
+
+        new_dfs = get_realtime_trades({ticker: watermarks[ticker] for ticker in tickers}, realTime)
+        if all(new_df.empty for new_df in new_dfs.values()):
+            # No new trades is normal for quiet tickers, but if the newest trade is now older than what was already
+            # seen (or there is none) the day rolled over or the replay restarted
+            seen = [watermarks[ticker][0] for ticker in tickers if watermarks.get(ticker) is not None]
+            if seen:
+                latest = get_realtime_latest(tickers, realTime)
+                if latest is None or latest < max(seen):
+                    self._reset(realTime)
+                    return {}
+            return {ticker: 0 for ticker in tickers}
+
+        with self._lock:
+            for ticker, new_df in new_dfs.items():
+                if not new_df.empty:
+                    self._fold(ticker, new_df, realTime)
+                    watermarks[ticker] = (new_df["localTS"].iat[-1], int(new_df["sequence_number"].iat[-1]))
+        return {ticker: len(new_dfs[ticker]) for ticker in tickers}
+
+    # Fill the window and the intraday bars of newly subscribed tickers, anchored at the newest second seen (or the
+    # newest trade, on the first tick). The window comes from per-second aggregates and the bars from the bars the
+    # database has aggregated so far, both up to the start of the current (longest) bar. From there on the raw
+    # trades take over, so that is where the watermark starts.
+    def _backfill(self, joined, realTime):
+        last = self._last[realTime]
+        if last is None:
+            last = get_realtime_latest(joined, realTime)
+        if last is None:
+            with self._lock:
+                for ticker in joined:
+                    self._series[realTime][ticker] = PriceRing(WINDOW_SECONDS)
+                    self._bars[realTime][ticker] = {seconds: BarBuilder(ticker, seconds) for seconds in BAR_SECONDS}
+                    self._watermarks[realTime][ticker] = None
+            return
+
+        last = pd.Timestamp(last).floor("s")
+        resume = last.floor(f"{max(BAR_SECONDS)}s")
+        resume_second = to_epoch_seconds([resume])[0]
+        second_dfs = get_realtime_second(joined, last - WINDOW, realTime)
+        bar_dfs = {seconds: get_realtime_sofar(joined, realTime, bucket_minutes=seconds // 60) for seconds in BAR_SECONDS}
+        with self._lock:
+            for ticker in joined:
+                ring = self._series[realTime][ticker] = PriceRing(WINDOW_SECONDS)
+                second_df = second_dfs[ticker]
+                if not second_df.empty:
+                    second_df = second_df[second_df["_id"] < resume]
+                    ring.upsert(to_epoch_seconds(second_df["_id"]), second_df["price"].to_numpy())
+                builders = self._bars[realTime][ticker] = {}
+                for seconds in BAR_SECONDS:
+                    builders[seconds] = BarBuilder(ticker, seconds)
+                    builders[seconds].seed(bar_dfs[seconds][ticker], resume_second)
+                self._watermarks[realTime][ticker] = (resume, -1)
+                self._open[realTime].pop(ticker, None)
+
+    # Fold a ticker's new trades into its window, continuing the provisional second if they start in it
+    def _fold(self, ticker, new_df, realTime):
+        seconds = to_epoch_seconds(new_df["localTS"])
+        prices = new_df["price"].to_numpy()
+        for builder in self._bars[realTime].get(ticker, {}).values():
+            builder.update(seconds, prices, new_df["size"].to_numpy())
+
+        open_ = self._open[realTime].get(ticker)
+        if open_ is not None and seconds[0] < open_[0]:
+            # Late-reported trades for seconds that are already final are dropped rather than overwriting them
+            keep = seconds >= open_[0]
+            if not keep.any():
+                return
+            seconds, prices = seconds[keep], prices[keep]
+        seconds, sums, counts = fold_seconds(seconds, prices)
+        if open_ is not None and open_[0] == seconds[0]:
+            sums[0] += open_[1]
+            counts[0] += open_[2]
+        self._series[realTime][ticker].upsert(seconds, sums / counts)
+        self._open[realTime][ticker] = (seconds[-1], sums[-1], counts[-1])
+
+        newest = pd.Timestamp(seconds[-1], unit="s")
+        if self._last[realTime] is None or self._last[realTime] < newest:
+            self._last[realTime] = newest
+
+    def _reset(self, realTime):
+        with self._lock:
+            self._series[realTime] = {}
+            self._watermarks[realTime] = {}
+            self._open[realTime] = {}
+            self._bars[realTime] = {}
+            self._last[realTime] = None
+        self._policy.retain(realTime)
+
+
+_EMPTY_WINDOW = PriceRing(1).window()
+
+
+@st.cache_resource
+def get_poller():
+    print("get_poller()")
+    return RealtimePoller()
+
+
+# Identify the current browser session so its subscription can be renewed across loop iterations
+def session_id():
+    if "poller_session_id" not in st.session_state:
+        st.session_state.poller_session_id = uuid.uuid4().hex
+    return st.session_state.poller_session_id
@@ -0,0 +1,115 @@
+import datetime
+import threading
+import time
+from collections import deque
+
+import streamlit as st
+from pymongo import monitoring
+
+from columnar import decode
+from tracing import span
+
+# Queries slower than this (milliseconds) have their explain output captured; override with slow_query_ms in secrets
+DEFAULT_SLOW_QUERY_MS = 500
+
+_local = threading.local()
+
+
+# Accumulates the round-trip time of every command (aggregate and the getMores that follow it) issued by the
+# current thread while a query is being recorded. Registered on the client by lib.init_connection.
+class RoundTripListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._add(event)
+
+    def failed(self, event):
+        self._add(event)
+
+    def _add(self, event):
+        if getattr(_local, "roundtrip_micros", None) is not None:
+            _local.roundtrip_micros += event.duration_micros
+
+
+# The most recent query records of this process
+class QueryLog:
+    def __init__(self, size=5000):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=size)
+
+    def append(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+@st.cache_resource
+def get_query_log():
+    print("get_query_log()")
+    return QueryLog()
+
+
+def slow_query_ms():
+    try:
+        return float(st.secrets.get("slow_query_ms", DEFAULT_SLOW_QUERY_MS))
+    except FileNotFoundError:
+        return DEFAULT_SLOW_QUERY_MS
+
+
+# Stage names with the fields each $match constrains, e.g. "$match(localDate,ticker) $sort $group $project $sort"
+def pipeline_shape(pipeline):
+    stages = []
+    for stage in pipeline:
+        for name, spec in stage.items():
+            if name == "$match":
+                stages.append(f"$match({','.join(sorted(spec))})")
+            else:
+                stages.append(name)
+    return " ".join(stages)
+
+
+def explain(collection, pipeline):
+    try:
+        return collection.database.command("aggregate", collection.name, pipeline=pipeline, explain=True)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# Run an aggregation, decode it with columnar.decode and record its shape, parameters, round-trip time, documents
+# returned and decoded bytes in the process query log
+def aggregate(collection, pipeline, schema, function, params):
+    with span(f"query.{function}") as trace_record:
+        _local.roundtrip_micros = 0
+        started = time.perf_counter()
+        try:
+            df = decode(collection.aggregate(pipeline), schema)
+        finally:
+            roundtrip_ms = _local.roundtrip_micros / 1000
+            _local.roundtrip_micros = None
+        total_ms = (time.perf_counter() - started) * 1000
+        trace_record.update(roundtrip_ms=roundtrip_ms, docs=len(df))
+
+    record = {
+        "time": datetime.datetime.now(),
+        "function": function,
+        "collection": collection.name,
+        "shape": pipeline_shape(pipeline),
+        "params": repr(params),
+        "roundtrip_ms": roundtrip_ms,
+        "total_ms": total_ms,
+        "docs": len(df),
+        "decoded_bytes": int(df.memory_usage(deep=True).sum()),
+        "explain": None,
+    }
+    if total_ms >= slow_query_ms():
+        record["explain"] = explain(collection, pipeline)
+    get_query_log().append(record)
+    return df
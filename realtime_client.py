@@ -0,0 +1,219 @@
+# Ingests trades from the market data provider's websocket feed into the realtime table (see demoarchitecture.py).
+# Messages are JSON arrays of events in the compact format documented there; only the trade fields sym, p, s, t and q
+# are kept and each trade becomes an insert document directly, without an intermediate model object. Documents are
+# batched and written with unordered insert_many from a small pool of writer threads; a batch is flushed when it
+# reaches --batch-size or is --flush-ms old, and once --max-pending batches are waiting the reader stops reading,
+# which pushes back on the feed instead of buffering without bound.
+#
+#     python realtime_client.py ws [--url wss://socket.polygon.io/stocks] [--key KEY] [--subscribe T.*]
+#     python realtime_client.py file trades.jsonl          one message per line
+#     python realtime_client.py tcp localhost:9000         one message per line
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    import json
+
+    loads = json.loads
+
+WEBSOCKET_URL = "wss://socket.polygon.io/stocks"
+BATCH_SIZE = 5000
+FLUSH_INTERVAL = 0.2
+MAX_PENDING = 8
+WRITERS = 2
+RECONNECT_DELAY = 5
+
+
+# Insert documents for the trade events of one message
+def documents(message):
+    return [
+        {"ticker": e["sym"], "price": e["p"], "size": e["s"], "timestamp": e["t"], "sequence_number": e["q"]}
+        for e in loads(message)
+        if e.get("ev") == "T"
+    ]
+
+
+class Ingester:
+    def __init__(
+        self, collection, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, writers=WRITERS
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writers = writers
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.batches = 0
+        self.waited = 0.0
+        self._queue = asyncio.Queue(max_pending)
+        self._buffer = []
+        self._first = None
+
+    async def add(self, message):
+        docs = documents(message)
+        if not docs:
+            return
+        if not self._buffer:
+            self._first = time.monotonic()
+        self._buffer.extend(docs)
+        self.received += len(docs)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        started = time.monotonic()
+        # Blocks while max_pending batches are waiting for a writer
+        await self._queue.put(batch)
+        self.waited += time.monotonic() - started
+
+    async def _timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval / 2)
+            if self._buffer and time.monotonic() - self._first >= self.flush_interval:
+                await self.flush()
+
+    async def _writer(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._queue.get()
+            try:
+                inserted = await loop.run_in_executor(executor, self._insert, batch)
+                self.inserted += inserted
+                self.failed += len(batch) - inserted
+                self.batches += 1
+            finally:
+                self._queue.task_done()
+
+    def _insert(self, batch):
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            return len(batch)
+        except BulkWriteError as e:
+            print(f"insert_many: {len(e.details['writeErrors'])} write errors")
+            return e.details["nInserted"]
+        except PyMongoError as e:
+            print(f"insert_many: {e}")
+            return 0
+
+    async def _report(self, every):
+        started = time.monotonic()
+        while True:
+            await asyncio.sleep(every)
+            elapsed = time.monotonic() - started
+            print(
+                f"{self.received:,} received, {self.inserted:,} inserted ({self.inserted / elapsed:,.0f}/s), "
+                f"{self.failed:,} failed, {self._queue.qsize()} batches pending"
+            )
+
+    # Ingest every message from an async iterator, then flush and wait for the writers to finish
+    async def run(self, messages, report_every=None):
+        with ThreadPoolExecutor(self.writers) as executor:
+            tasks = [asyncio.create_task(self._writer(executor)) for _ in range(self.writers)]
+            tasks.append(asyncio.create_task(self._timer()))
+            if report_every:
+                tasks.append(asyncio.create_task(self._report(report_every)))
+            try:
+                async for message in messages:
+                    await self.add(message)
+                await self.flush()
+                await self._queue.join()
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+
+async def websocket_messages(url, key, subscribe):
+    import websockets
+
+    while True:
+        try:
+            async with websockets.connect(url, max_queue=1024) as ws:
+                await ws.send(f'{{"action":"auth","params":"{key}"}}')
+                await ws.send(f'{{"action":"subscribe","params":"{subscribe}"}}')
+                async for message in ws:
+                    yield message
+        except (OSError, websockets.ConnectionClosed) as e:
+            print(f"websocket: {e}, reconnecting in {RECONNECT_DELAY}s")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+async def file_messages(path):
+    with open(path, "rb") as f:
+        for i, line in enumerate(f):
+            yield line
+            # Let the timer and writers run between messages
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+
+
+async def socket_messages(address):
+    host, port = address.rsplit(":", 1)
+    reader, writer = await asyncio.open_connection(host, int(port))
+    try:
+        while line := await reader.readline():
+            yield line
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sources = parser.add_subparsers(dest="source", required=True)
+
+    p = sources.add_parser("ws")
+    p.add_argument("--url", default=WEBSOCKET_URL)
+    p.add_argument("--key", default=os.environ.get("POLYGON_API_KEY"))
+    p.add_argument("--subscribe", default="T.*")
+
+    p = sources.add_parser("file")
+    p.add_argument("path")
+
+    p = sources.add_parser("tcp")
+    p.add_argument("address", help="host:port")
+
+    for p in sources.choices.values():
+        p.add_argument("--collection", default="realtime")
+        p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        p.add_argument("--flush-ms", type=int, default=int(FLUSH_INTERVAL * 1000))
+        p.add_argument("--max-pending", type=int, default=MAX_PENDING)
+        p.add_argument("--writers", type=int, default=WRITERS)
+        p.add_argument("--report-every", type=int, default=10, help="seconds")
+
+    args = parser.parse_args()
+
+    from lib import init_connection
+
+    collection = init_connection().stocks[args.collection]
+
+    if args.source == "ws":
+        if not args.key:
+            parser.error("--key or POLYGON_API_KEY is required")
+        messages = websocket_messages(args.url, args.key, args.subscribe)
+    elif args.source == "file":
+        messages = file_messages(args.path)
+    else:
+        messages = socket_messages(args.address)
+
+    async def run():
+        ingester = Ingester(collection, args.batch_size, args.flush_ms / 1000, args.max_pending, args.writers)
+        await ingester.run(messages, args.report_every)
+        print(f"{ingester.received:,} received, {ingester.inserted:,} inserted, {ingester.failed:,} failed")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import datetime
+
+from trading_calendar import market_phase, next_pre_open, nytz
+
+# Fastest and slowest poll interval (seconds) of a ticker in each part of the trading day. Replay plays back a
+# regular session, so it always uses the regular bounds.
+PHASE_INTERVALS = {
+    "regular": (0.5, 10),
+    "pre": (2, 30),
+    "post": (2, 30),
+    "closed": (60, 600),
+}
+
+# A ticker is polled about as often as it takes to collect this many new trades at its recent rate
+TRADES_PER_POLL = 5
+
+# Weight of the latest poll in a ticker's trade rate (exponentially weighted)
+RATE_WEIGHT = 0.3
+
+# How often a live view reruns while it shows the real-time table and the market is closed (seconds). Each run
+# renews the session's poller subscription and scheduler lease, so it must stay under poller.SUBSCRIPTION_TIMEOUT
+# and scheduler.LEASE_TIMEOUT (30 s); otherwise the tickers would be dropped and backfilled again on every run.
+CLOSED_VIEW_INTERVAL = 20
+
+MODES = ["Real-Time", "Replay"]
+
+
+# Per-ticker poll intervals for the realtime poller. Busy tickers are polled at the phase's fastest rate and quiet
+# ones less often, in proportion to their recent trade rate; each poll in a row that returns nothing doubles the
+# interval up to the phase's slowest. While the market is closed the interval is also cut short at the next
+# pre-market open, so polling picks up again when trading does.
+class RefreshPolicy:
+    def __init__(self):
+        self._state = {True: {}, False: {}}
+
+    # The tickers that should be polled now; tickers not polled yet are always due
+    def due(self, realTime, tickers, now):
+        state = self._state[realTime]
+        return [ticker for ticker in tickers if ticker not in state or state[ticker]["due"] <= now]
+
+    # Record that a poll at `now` (monotonic seconds) returned `trades` new trades for the ticker, and schedule its
+    # next poll
+    def observe(self, realTime, ticker, trades, now):
+        state = self._state[realTime].setdefault(ticker, {"due": now, "polled": None, "rate": None, "empty": 0})
+        if state["polled"] is not None and now > state["polled"]:
+            rate = trades / (now - state["polled"])
+            state["rate"] = rate if state["rate"] is None else RATE_WEIGHT * rate + (1 - RATE_WEIGHT) * state["rate"]
+        state["empty"] = 0 if trades else state["empty"] + 1
+        state["polled"] = now
+        state["due"] = now + self.interval(realTime, state["rate"], state["empty"])
+
+    def interval(self, realTime, rate, empty):
+        phase = market_phase() if realTime else "regular"
+        fastest, slowest = PHASE_INTERVALS[phase]
+        interval = fastest if not rate else min(slowest, max(fastest, TRADES_PER_POLL / rate))
+        interval = min(slowest, interval * 2**empty)
+        if phase == "closed":
+            now = datetime.datetime.now(nytz)
+            interval = max(fastest, min(interval, (next_pre_open(now) - now).total_seconds()))
+        return interval
+
+    # Forget the tickers of a mode that are no longer subscribed (or all of them)
+    def retain(self, realTime, tickers=()):
+        for ticker in list(self._state[realTime]):
+            if ticker not in tickers:
+                del self._state[realTime][ticker]
+
+
+# The mode a live view starts in: the real-time table while there is any trading (including the extended sessions),
+# the replay otherwise
+def default_mode():
+    return "Replay" if market_phase() == "closed" else "Real-Time"
+
+
+# How often a live view reruns: `interval`, or CLOSED_VIEW_INTERVAL for the real-time table while the market is
+# closed and nothing arrives
+def view_interval(realTime, interval):
+    return CLOSED_VIEW_INTERVAL if realTime and market_phase() == "closed" else interval
@@ -0,0 +1,233 @@
+# A local replay snapshot: a window of the trades table exported once into flat arrays sorted by ticker and time,
+# with a per-ticker offset index. Replay mode reads the snapshot through memory maps instead of polling the replay
+# table, so it costs nothing at the database and starts instantly. The snapshot plays back against the wall clock
+# and restarts every window length, like the replay client that truncates and refills the replay table.
+#
+#     python replay.py export --date 2024-04-09 [--start 09:30] [--minutes 10] [--out replay_snapshot]
+#
+# Point the app at the directory with replay_snapshot in secrets or the REPLAY_SNAPSHOT environment variable.
+#
+# Layout of the directory:
+#     index.json      {"start": local wall-clock ISO time, "seconds": window length, "tickers": {ticker: [begin, end]}}
+#     offset_ms.npy   int32 milliseconds since start
+#     price.npy       float64
+#     size.npy        int32
+#     sequence.npy    int64 sequence numbers
+import argparse
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytz
+import streamlit as st
+
+from columnar import decode, split_by_ticker
+
+TRADE_SCHEMA = {"ticker": "category", "localTS": "datetime", "sequence_number": "int", "price": "float", "size": "int"}
+
+
+class ReplaySnapshot:
+    def __init__(self, path):
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        self.start = np.datetime64(index["start"], "ms")
+        self.seconds = index["seconds"]
+        self.tickers = {ticker: tuple(bounds) for ticker, bounds in index["tickers"].items()}
+        self.offset_ms = np.load(os.path.join(path, "offset_ms.npy"), mmap_mode="r")
+        self.price = np.load(os.path.join(path, "price.npy"), mmap_mode="r")
+        self.size = np.load(os.path.join(path, "size.npy"), mmap_mode="r")
+        self.sequence = np.load(os.path.join(path, "sequence.npy"), mmap_mode="r")
+
+    # Milliseconds into the window that playback has reached at `now` (epoch seconds)
+    def cursor(self, now=None):
+        now = time.time() if now is None else now
+        return int(now % self.seconds * 1000)
+
+    # The ticker's trades from `since_ms` up to the cursor, as (offset_ms, price, size) views
+    def _trades(self, ticker, since_ms, until_ms):
+        begin, end = self.tickers.get(ticker, (0, 0))
+        offsets = self.offset_ms[begin:end]
+        lo = np.searchsorted(offsets, since_ms, "left") if since_ms > 0 else 0
+        hi = np.searchsorted(offsets, until_ms, "right")
+        return offsets[lo:hi], self.price[begin + lo:begin + hi], self.size[begin + lo:begin + hi]
+
+    def _offset(self, ts):
+        return int((np.datetime64(pd.Timestamp(ts).tz_localize(None), "ms") - self.start).astype(np.int64))
+
+    # Same result as data.get_realtime_second over the replay table: the average price of each second at or after
+    # `last`, per ticker. Nothing is returned once `last` is past the cursor, i.e. after playback restarted.
+    def realtime_second(self, selectedTickers, last, now=None):
+        until_ms = self.cursor(now)
+        since_ms = 0 if last is None else self._offset(last)
+        frames = []
+        for ticker in selectedTickers:
+            offsets, prices, _ = self._trades(ticker, since_ms, until_ms)
+            if not len(offsets):
+                continue
+            seconds = offsets // 1000
+            starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+            counts = np.diff(np.r_[starts, len(seconds)])
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "_id": (self.start + seconds[starts].astype("timedelta64[s]")).astype("datetime64[ns]"),
+                        "ticker": ticker,
+                        "price": np.add.reduceat(prices, starts) / counts,
+                    }
+                )
+            )
+        return split_by_ticker(_concat(frames, "_id"), selectedTickers)
+
+    # Same result as data.get_realtime_trades over the replay table
+    def realtime_trades(self, watermarks, now=None):
+        until_ms = self.cursor(now)
+        frames = []
+        for ticker, watermark in watermarks.items():
+            begin, end = self.tickers.get(ticker, (0, 0))
+            since_ms, sequence_number = (0, -1) if watermark is None else (self._offset(watermark[0]), watermark[1])
+            offsets = self.offset_ms[begin:end]
+            lo = begin + np.searchsorted(offsets, since_ms, "left")
+            hi = begin + np.searchsorted(offsets, until_ms, "right")
+            new = self.sequence[lo:hi] > sequence_number
+            if not new.any():
+                continue
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "ticker": ticker,
+                        "localTS": (self.start + self.offset_ms[lo:hi][new].astype("timedelta64[ms]")).astype(
+                            "datetime64[ns]"
+                        ),
+                        "sequence_number": self.sequence[lo:hi][new],
+                        "price": self.price[lo:hi][new],
+                        "size": self.size[lo:hi][new].astype(np.int64),
+                    }
+                )
+            )
+        return split_by_ticker(_concat(frames, ["localTS", "sequence_number"]), list(watermarks))
+
+    # Same result as data.get_realtime_latest over the replay table
+    def realtime_latest(self, selectedTickers, now=None):
+        until_ms = self.cursor(now)
+        latest = None
+        for ticker in selectedTickers:
+            offsets, _, _ = self._trades(ticker, 0, until_ms)
+            if len(offsets) and (latest is None or offsets[-1] > latest):
+                latest = offsets[-1]
+        return None if latest is None else pd.Timestamp(self.start + np.timedelta64(int(latest), "ms"))
+
+    # Same result as data.get_realtime_sofar over the replay table: bars of everything played so far
+    def realtime_sofar(self, selectedTickers, now=None, bucket_minutes=5):
+        until_ms = self.cursor(now)
+        bucket_ms = bucket_minutes * 60 * 1000
+        epoch_ms = int(self.start.astype(np.int64))
+        frames = []
+        for ticker in selectedTickers:
+            offsets, prices, sizes = self._trades(ticker, 0, until_ms)
+            if not len(offsets):
+                continue
+            buckets = (epoch_ms + offsets.astype(np.int64)) // bucket_ms
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            ends = np.r_[starts[1:], len(buckets)] - 1
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "ticker": ticker,
+                        "date": (self.start + offsets[starts].astype("timedelta64[ms]")).astype("datetime64[ns]"),
+                        "open": prices[starts],
+                        "high": np.maximum.reduceat(prices, starts),
+                        "low": np.minimum.reduceat(prices, starts),
+                        "close": prices[ends],
+                        "volume": np.add.reduceat(sizes.astype(np.int64), starts),
+                    }
+                )
+            )
+        return split_by_ticker(_concat(frames, "date"), selectedTickers)
+
+
+def _concat(frames, by):
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True).sort_values(by, kind="stable", ignore_index=True)
+    df["ticker"] = df["ticker"].astype("category")
+    return df
+
+
+def snapshot_path():
+    try:
+        return os.environ.get("REPLAY_SNAPSHOT") or st.secrets.get("replay_snapshot")
+    except FileNotFoundError:
+        return None
+
+
+# The configured snapshot, or None to read the replay table
+@st.cache_resource
+def get_replay_snapshot():
+    print("get_replay_snapshot()")
+    path = snapshot_path()
+    return ReplaySnapshot(path) if path else None
+
+
+# Write the trades of [start, start + minutes) on a local date to `out`
+def export(db, start, minutes, out):
+    end = start + datetime.timedelta(minutes=minutes)
+    cursor = db.trades.find(
+        {
+            "localDate": datetime.datetime.combine(start.date(), datetime.time(), tzinfo=pytz.UTC),
+            "localTS": {"$gte": start.replace(tzinfo=pytz.UTC), "$lt": end.replace(tzinfo=pytz.UTC)},
+        },
+        {"_id": 0, **{field: 1 for field in TRADE_SCHEMA}},
+        batch_size=10_000,
+    )
+    df = decode(cursor, TRADE_SCHEMA)
+    if df.empty:
+        raise SystemExit(f"no trades between {start} and {end}")
+    df["ticker"] = df["ticker"].astype(str)
+    df = df.sort_values(["ticker", "localTS", "sequence_number"], ignore_index=True)
+
+    ticker_starts = np.flatnonzero(np.r_[True, df["ticker"].values[1:] != df["ticker"].values[:-1]])
+    ticker_ends = np.r_[ticker_starts[1:], len(df)]
+    index = {
+        "start": start.isoformat(),
+        "seconds": minutes * 60,
+        "tickers": {
+            df["ticker"].iat[begin]: [int(begin), int(end)] for begin, end in zip(ticker_starts, ticker_ends)
+        },
+    }
+
+    os.makedirs(out, exist_ok=True)
+    offsets = (df["localTS"] - pd.Timestamp(start)) // pd.Timedelta(milliseconds=1)
+    np.save(os.path.join(out, "offset_ms.npy"), offsets.to_numpy(np.int32))
+    np.save(os.path.join(out, "price.npy"), df["price"].to_numpy(np.float64))
+    np.save(os.path.join(out, "size.npy"), df["size"].to_numpy(np.int32))
+    np.save(os.path.join(out, "sequence.npy"), df["sequence_number"].to_numpy(np.int64))
+    with open(os.path.join(out, "index.json"), "w") as f:
+        json.dump(index, f)
+    print(f"{len(df):,} trades of {len(index['tickers']):,} tickers written to {out}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("export")
+    p.add_argument("--date", type=datetime.date.fromisoformat, required=True)
+    p.add_argument("--start", type=datetime.time.fromisoformat, default=datetime.time(9, 30))
+    p.add_argument("--minutes", type=int, default=10)
+    p.add_argument("--out", default="replay_snapshot")
+
+    args = parser.parse_args()
+
+    from lib import init_connection
+
+    db = init_connection().stocks
+
+    if args.command == "export":
+        export(db, datetime.datetime.combine(args.date, args.start), args.minutes, args.out)
+
+
+if __name__ == "__main__":
+    main()
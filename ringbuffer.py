@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+# A fixed-size window of per-second prices for one ticker, indexed by epoch second.
+# Every slot is stored twice (at i and i + capacity) so that any window ending at the newest second is a single
+# contiguous slice of the underlying arrays and can be handed out without copying.
+class PriceRing:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.head = None
+        self._times = np.zeros(2 * capacity, dtype=np.int64)
+        self._prices = np.full(2 * capacity, np.nan)
+        self._valid = np.zeros(2 * capacity, dtype=bool)
+
+    def clear(self):
+        self.head = None
+        self._prices[:] = np.nan
+        self._valid[:] = False
+
+    # Insert or overwrite prices for the given epoch seconds; cost is proportional to the number of new points
+    # (plus the number of seconds the window advances, which is at most the capacity)
+    def upsert(self, seconds, prices):
+        seconds = np.asarray(seconds, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(seconds) == 0:
+            return
+
+        newest = seconds.max()
+        if self.head is None or newest > self.head:
+            self._advance(newest)
+
+        keep = seconds > self.head - self.capacity
+        slots = seconds[keep] % self.capacity
+        prices = prices[keep]
+        for offset in (0, self.capacity):
+            self._prices[slots + offset] = prices
+            self._valid[slots + offset] = True
+
+    def _advance(self, newest):
+        if self.head is None or newest - self.head >= self.capacity:
+            fresh = np.arange(newest - self.capacity + 1, newest + 1, dtype=np.int64)
+        else:
+            fresh = np.arange(self.head + 1, newest + 1, dtype=np.int64)
+        slots = fresh % self.capacity
+        for offset in (0, self.capacity):
+            self._times[slots + offset] = fresh
+            self._prices[slots + offset] = np.nan
+            self._valid[slots + offset] = False
+        self.head = newest
+
+    # Views over the most recent `seconds` slots ending at the newest second: (times, prices, valid).
+    # Times are returned as datetime64[s]; prices are NaN where no trade was seen.
+    def window(self, seconds=None):
+        if self.head is None:
+            return np.array([], dtype="datetime64[s]"), np.array([]), np.array([], dtype=bool)
+        n = self.capacity if seconds is None else min(seconds, self.capacity)
+        end = self.head % self.capacity + self.capacity + 1
+        start = end - n
+        return self._times[start:end].view("datetime64[s]"), self._prices[start:end], self._valid[start:end]
+
+
+# Convert a Series of naive timestamps (as returned for `_id` by get_realtime_second) to epoch seconds
+def to_epoch_seconds(timestamps):
+    return pd.to_datetime(timestamps).values.astype("datetime64[s]").astype(np.int64)
+
+
+# Fold trades (epoch seconds in ascending order, prices) into per-second (seconds, price sums, trade counts)
+def fold_seconds(seconds, prices):
+    seconds = np.asarray(seconds, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+    counts = np.diff(np.r_[starts, len(seconds)])
+    return seconds[starts], np.add.reduceat(np.asarray(prices, dtype=np.float64), starts), counts
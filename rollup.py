@@ -0,0 +1,200 @@
+# Maintains the stocks_day and stocks_hour rollups of stocks_min (see setup.sql) that get_stock_min reads for
+# closed days, the ticker_catalog that lib.get_tickers reads, and the rollup_status range of days that are complete.
+#
+#     python rollup.py backfill --start 2015-01-01 [--end 2024-06-30] [--days 7]
+#     python rollup.py catchup [--every 60]
+#     python rollup.py check --tickers AAPL,MSFT --start 2024-03-01 --end 2024-05-31
+import argparse
+import datetime
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from lib import init_connection
+from trading_calendar import next_trading_day, previous_trading_day
+from data import ROLLUP_TABLES, local_date, read_rollup, read_rollup_status, aggregate_stock_min
+
+ROLLUP_SQL = {
+    "Day": """
+        INSERT INTO stocks_day (localDate, ticker, volume, open, close, high, low, transactions, bars)
+        SELECT localDate, ticker, SUM(volume), FIRST(open, localTS), LAST(close, localTS), MAX(high), MIN(low),
+            SUM(transactions), COUNT(*)
+        FROM stocks_min
+        WHERE localDate BETWEEN '{start}' AND '{end}'
+        GROUP BY localDate, ticker
+        ON DUPLICATE KEY UPDATE volume = VALUES(volume), open = VALUES(open), close = VALUES(close),
+            high = VALUES(high), low = VALUES(low), transactions = VALUES(transactions), bars = VALUES(bars)
+    """,
+    "Hour": """
+        INSERT INTO stocks_hour (localTS, localDate, ticker, volume, open, close, high, low, transactions, bars)
+        SELECT DATE_TRUNC('hour', localTS), localDate, ticker, SUM(volume), FIRST(open, localTS), LAST(close, localTS),
+            MAX(high), MIN(low), SUM(transactions), COUNT(*)
+        FROM stocks_min
+        WHERE localDate BETWEEN '{start}' AND '{end}'
+        GROUP BY DATE_TRUNC('hour', localTS), localDate, ticker
+        ON DUPLICATE KEY UPDATE volume = VALUES(volume), open = VALUES(open), close = VALUES(close),
+            high = VALUES(high), low = VALUES(low), transactions = VALUES(transactions), bars = VALUES(bars)
+    """,
+}
+
+# Days rolled up per statement when catchup has fallen behind
+CATCHUP_DAYS = 7
+
+CATALOG_SQL = """
+    INSERT INTO ticker_catalog (ticker, firstDate, lastDate)
+    SELECT ticker, MIN(localDate), MAX(localDate)
+    FROM stocks_day
+    WHERE localDate BETWEEN '{start}' AND '{end}'
+    GROUP BY ticker
+    ON DUPLICATE KEY UPDATE firstDate = LEAST(firstDate, VALUES(firstDate)), lastDate = GREATEST(lastDate, VALUES(lastDate))
+"""
+
+
+STATUS_SQL = """
+    INSERT INTO rollup_status (name, firstDate, lastDate) VALUES ('stocks_min', '{first}', '{last}')
+    ON DUPLICATE KEY UPDATE firstDate = VALUES(firstDate), lastDate = VALUES(lastDate)
+"""
+
+
+def today():
+    return datetime.datetime.now(pytz.timezone("America/New_York")).date()
+
+
+def _date(day):
+    return day.date() if isinstance(day, datetime.datetime) else day
+
+
+# The last day in an inclusive range of local dates with bars in stocks_min, or None
+def ingested_through(db, start, end):
+    day1 = local_date(datetime.datetime.combine(start, datetime.time()))
+    day2 = local_date(datetime.datetime.combine(end, datetime.time()))
+    last = list(
+        db.stocks_min.aggregate(
+            [
+                {"$match": {"localDate": {"$gte": day1, "$lte": day2}}},
+                {"$group": {"_id": None, "last": {"$max": "$localDate"}}},
+            ]
+        )
+    )
+    return _date(last[0]["last"]) if last and last[0]["last"] is not None else None
+
+
+# Rebuild both rollups for an inclusive range of local dates, then extend the ticker catalog from the daily rollup
+# and mark the days up to the last one with bars as complete. That day is read first, so bars loaded while the
+# statements run are only counted by the next run.
+def rollup(db, start, end):
+    last = ingested_through(db, start, end)
+    statements = [(ROLLUP_TABLES[aggregation_period], sql) for aggregation_period, sql in ROLLUP_SQL.items()]
+    statements.append(("ticker_catalog", CATALOG_SQL))
+    for table, sql in statements:
+        started = time.monotonic()
+        db.command({"sql": sql.format(start=start.isoformat(), end=end.isoformat())})
+        print(f"{table} {start}..{end} in {time.monotonic() - started:.1f}s")
+    if last is not None:
+        mark_complete(db, start, last)
+
+
+# Extend the complete range with the days from `start` through `last`. The range only covers contiguous trading
+# days, so a range that neither overlaps nor adjoins it replaces it if it ends later and is dropped otherwise.
+def mark_complete(db, start, last):
+    first, through = read_rollup_status(db)
+    if first is not None:
+        first, through = _date(first), _date(through)
+        if start <= next_trading_day(through) and last >= previous_trading_day(first):
+            start, last = min(start, first), max(last, through)
+        elif last < through:
+            return
+    db.command({"sql": STATUS_SQL.format(first=start.isoformat(), last=last.isoformat())})
+    print(f"rollup_status {start}..{last}")
+
+
+def backfill(db, start, end, days):
+    while start <= end:
+        chunk_end = min(end, start + datetime.timedelta(days=days - 1))
+        rollup(db, start, chunk_end)
+        start = chunk_end + datetime.timedelta(days=1)
+
+
+# Refresh the current day and every day since the last complete one (at least the previous day, for bars that
+# arrived late)
+def catchup(db, every):
+    while True:
+        try:
+            start = today() - datetime.timedelta(days=1)
+            _, through = read_rollup_status(db)
+            if through is not None:
+                start = min(start, _date(through) + datetime.timedelta(days=1))
+            backfill(db, start, today(), CATCHUP_DAYS)
+        except Exception as e:
+            print(f"catchup: {e}")
+            if not every:
+                raise
+        if not every:
+            return
+        time.sleep(every)
+
+
+# Compare the rollups with the on-the-fly aggregation of stocks_min; returns the number of mismatched bars
+def check(db, tickers, start, end):
+    day1 = local_date(datetime.datetime.combine(start, datetime.time()))
+    day2 = local_date(datetime.datetime.combine(end, datetime.time()))
+    columns = ["open", "high", "low", "close", "volume"]
+
+    mismatches = 0
+    for aggregation_period in ROLLUP_TABLES:
+        expected = aggregate_stock_min(db, tickers, day1, day2, aggregation_period)
+        actual = read_rollup(db, tickers, day1, day2, aggregation_period)
+        if expected.empty and actual.empty:
+            print(f"{aggregation_period}: no bars")
+            continue
+        for df in (expected, actual):
+            if not df.empty:
+                df["ticker"] = df["ticker"].astype(str)
+
+        merged = pd.merge(
+            expected, actual, on=["ticker", "date"], how="outer", suffixes=("_expected", "_actual"), indicator=True
+        )
+        bad = merged["_merge"] != "both"
+        for column in columns:
+            bad |= ~np.isclose(merged[f"{column}_expected"], merged[f"{column}_actual"], equal_nan=True)
+
+        print(f"{aggregation_period}: {len(merged)} bars, {bad.sum()} mismatched")
+        if bad.any():
+            print(merged[bad].head(20).to_string())
+        mismatches += int(bad.sum())
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("backfill")
+    p.add_argument("--start", type=datetime.date.fromisoformat, required=True)
+    p.add_argument("--end", type=datetime.date.fromisoformat, default=None)
+    p.add_argument("--days", type=int, default=7)
+
+    p = commands.add_parser("catchup")
+    p.add_argument("--every", type=int, default=0, help="repeat every N seconds")
+
+    p = commands.add_parser("check")
+    p.add_argument("--tickers", required=True)
+    p.add_argument("--start", type=datetime.date.fromisoformat, required=True)
+    p.add_argument("--end", type=datetime.date.fromisoformat, required=True)
+
+    args = parser.parse_args()
+    db = init_connection().stocks
+
+    if args.command == "backfill":
+        backfill(db, args.start, args.end or today(), args.days)
+    elif args.command == "catchup":
+        catchup(db, args.every)
+    elif args.command == "check":
+        sys.exit(1 if check(db, args.tickers.split(","), args.start, args.end) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import streamlit as st
+
+from data import setting
+from poller import get_poller, session_id
+
+# Sessions that get live updates at the full rate; sessions over the cap are refreshed every DEGRADED_INTERVAL
+# seconds until a lease frees up. Override with max_live_sessions in secrets.
+DEFAULT_MAX_LIVE_SESSIONS = 50
+DEGRADED_INTERVAL = 15
+
+# Live updates of a session without client activity (a page rerun from a widget) for this long are suspended until
+# the viewer resumes them. Override with live_idle_minutes in secrets.
+DEFAULT_IDLE_MINUTES = 15
+
+# A lease that is not renewed by a live fragment run for this many seconds is released (closed tab, other page)
+LEASE_TIMEOUT = 30
+
+
+# Admission for the live panels of every session in the process. The panels are fragments that the browser reruns
+# on a timer; the poller does the database work once for all of them, so what a session costs the server is its
+# fragment runs. A bounded number of sessions hold a lease and run at the page's rate, the rest run degraded at a
+# fixed slow rate, and idle sessions are suspended and stop running fragments at all.
+class LiveScheduler:
+    def __init__(self, max_sessions, idle_seconds):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._activity = {}
+
+    def touch(self, session_id):
+        with self._lock:
+            self._activity[session_id] = time.monotonic()
+
+    # "live" (holding a lease, renewed by this call), "degraded" (over the cap) or "suspended" (idle)
+    def mode(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            for other, renewed in list(self._leases.items()):
+                if now - renewed > LEASE_TIMEOUT:
+                    del self._leases[other]
+            for other, active in list(self._activity.items()):
+                if now - active > self.idle_seconds + LEASE_TIMEOUT and other not in self._leases:
+                    del self._activity[other]
+
+            if now - self._activity.setdefault(session_id, now) > self.idle_seconds:
+                self._leases.pop(session_id, None)
+                return "suspended"
+            if session_id in self._leases or len(self._leases) < self.max_sessions:
+                self._leases[session_id] = now
+                return "live"
+            return "degraded"
+
+    # (sessions holding a lease, cap)
+    def stats(self):
+        with self._lock:
+            return len(self._leases), self.max_sessions
+
+
+@st.cache_resource
+def get_live_scheduler():
+    print("get_live_scheduler()")
+    max_sessions = int(setting("max_live_sessions", DEFAULT_MAX_LIVE_SESSIONS))
+    idle_minutes = float(setting("live_idle_minutes", DEFAULT_IDLE_MINUTES))
+    return LiveScheduler(max_sessions, idle_minutes * 60)
+
+
+# Admit the session to live updates for this page run. Returns the interval (seconds) for the page's live
+# fragments: `interval` while it holds a lease, DEGRADED_INTERVAL over the cap (with a notice saying so), or None
+# while suspended, in which case a notice with a button to resume is shown instead and no live fragment should run.
+def live_interval(interval):
+    scheduler = get_live_scheduler()
+    if st.session_state.get("live_suspended"):
+        if not st.button("Resume live updates"):
+            st.info(f"Live updates are paused after {scheduler.idle_seconds / 60:.0f} minutes without activity.")
+            st.session_state.live_mode = "suspended"
+            return None
+        st.session_state.live_suspended = False
+
+    scheduler.touch(session_id())
+    mode = scheduler.mode(session_id())
+    st.session_state.live_mode = mode
+    if mode == "degraded":
+        _, cap = scheduler.stats()
+        st.warning(
+            f"Live updates are limited to {cap} viewers at full speed and all of them are in use; this page "
+            f"refreshes every {DEGRADED_INTERVAL} seconds until one frees up."
+        )
+        return DEGRADED_INTERVAL
+    return interval
+
+
+# Call at the start of each run of a page's main live fragment: renews the session's lease and reruns the page
+# when its mode changed since the page run (a lease freed up, or the session went idle and is suspended)
+def keep_live():
+    mode = get_live_scheduler().mode(session_id())
+    if mode == st.session_state.get("live_mode"):
+        return
+    if mode == "suspended":
+        st.session_state.live_suspended = True
+        get_poller().unsubscribe(session_id())
+    st.rerun()
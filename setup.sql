@@ -163,3 +163,53 @@ CREDENTIALS '{"aws_access_key_id": "ACCESS_KEY_ID",
 INTO TABLE trades
 FIELDS TERMINATED BY ',' ENCLOSED BY '"' IGNORE 1 LINES;
 START PIPELINE trades_pipeline_2024;
+
+-- Daily and hourly rollups of stocks_min, maintained by rollup.py
+-- (run "python rollup.py backfill" once, then "python rollup.py catchup --every 60" to keep the current day fresh)
+DROP TABLE IF EXISTS stocks_day;
+CREATE TABLE stocks_day(
+  localDate DATE NOT NULL,
+  ticker LONGTEXT NOT NULL,
+  volume BIGINT NOT NULL,
+  open DOUBLE NOT NULL,
+  close DOUBLE NOT NULL,
+  high DOUBLE NOT NULL,
+  low DOUBLE NOT NULL,
+  transactions BIGINT NOT NULL,
+  bars BIGINT NOT NULL,
+  UNIQUE KEY (localDate, ticker) USING HASH,
+  SORT KEY (localDate, ticker),
+  SHARD KEY(ticker));
+
+DROP TABLE IF EXISTS stocks_hour;
+CREATE TABLE stocks_hour(
+  localTS DATETIME(6) NOT NULL,
+  localDate DATE NOT NULL,
+  ticker LONGTEXT NOT NULL,
+  volume BIGINT NOT NULL,
+  open DOUBLE NOT NULL,
+  close DOUBLE NOT NULL,
+  high DOUBLE NOT NULL,
+  low DOUBLE NOT NULL,
+  transactions BIGINT NOT NULL,
+  bars BIGINT NOT NULL,
+  UNIQUE KEY (localDate, ticker, localTS) USING HASH,
+  SORT KEY (localDate, ticker, localTS),
+  SHARD KEY(ticker));
+
+-- One row per ticker with its first and last trading date, maintained by rollup.py from stocks_day
+DROP TABLE IF EXISTS ticker_catalog;
+CREATE REFERENCE TABLE ticker_catalog(
+  ticker VARCHAR(32) NOT NULL,
+  firstDate DATE NOT NULL,
+  lastDate DATE NOT NULL,
+  PRIMARY KEY (ticker));
+
+-- The range of days rollup.py has rolled up completely (up to the last day it found in stocks_min); get_stock_min
+-- reads those days from the rollups and aggregates any others from stocks_min
+DROP TABLE IF EXISTS rollup_status;
+CREATE REFERENCE TABLE rollup_status(
+  name VARCHAR(32) NOT NULL,
+  firstDate DATE NOT NULL,
+  lastDate DATE NOT NULL,
+  PRIMARY KEY (name));
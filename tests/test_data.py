@@ -0,0 +1,91 @@
+import datetime
+
+import mongomock
+import pytest
+import pytz
+
+import data
+
+nytz = pytz.timezone("America/New_York")
+
+# Mon 2024-04-08 to Thu 2024-04-11, all trading days; rollup.py has completed the days through Wednesday
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY = (datetime.datetime(2024, 4, day) for day in (8, 9, 10, 11))
+
+
+def local(day):
+    return nytz.localize(day)
+
+
+def key(ticker, day, aggregation_period="Day"):
+    return ticker, pytz.UTC.localize(day), aggregation_period
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setenv("BAR_STORE_PATH", str(tmp_path / "bars"))
+    data.get_result_cache.clear()
+    data.get_bar_store.clear()
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(data, "init_connection", lambda: client)
+    db = client.stocks
+    # A has no bars on Tuesday (a gap in its history), B only trades from Wednesday. The rollups cover the days
+    # through Wednesday; Thursday is aggregated from stocks_min.
+    for ticker, days in (("A", (MONDAY, WEDNESDAY, THURSDAY)), ("B", (WEDNESDAY, THURSDAY))):
+        for day in days:
+            bar = {"ticker": ticker, "localDate": day, "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5, "volume": 10}
+            db.stocks_min.insert_one(dict(bar, localTS=day + datetime.timedelta(hours=10)))
+            if day <= WEDNESDAY:
+                db.stocks_day.insert_one(bar)
+    db.rollup_status.insert_one({"name": "stocks_min", "firstDate": MONDAY, "lastDate": WEDNESDAY})
+    yield db
+    data.get_result_cache.clear()
+    data.get_bar_store.clear()
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+    fetch = data.fetch_stock_min
+
+    def counted(db, selectedTickers, day1, day2, aggregation_period, strategy=None):
+        calls.append((tuple(selectedTickers), day1.date(), day2.date()))
+        return fetch(db, selectedTickers, day1, day2, aggregation_period, strategy)
+
+    monkeypatch.setattr(data, "fetch_stock_min", counted)
+    return calls
+
+
+def expiry(ticker, day):
+    return data.get_result_cache()._entries[("get_stock_min", key(ticker, day))][1]
+
+
+def test_empty_trading_day_below_watermark_is_final(db, fetches):
+    df = data.get_stock_min(["A"], local(MONDAY), local(THURSDAY), "Day")
+    assert len(df) == 3
+    assert expiry("A", TUESDAY) is None
+    assert expiry("A", WEDNESDAY) is None
+    # Thursday is after the last complete day, so it is refreshed
+    assert expiry("A", THURSDAY) is not None
+
+    fetches.clear()
+    data.get_stock_min(["A"], local(MONDAY), local(WEDNESDAY), "Day")
+    assert fetches == []
+
+
+def test_gaps_are_stored_up_to_the_watermark(db, fetches):
+    data.get_stock_min(["A", "B"], local(MONDAY), local(THURSDAY), "Day")
+
+    store = data.get_bar_store()
+    complete = [key(ticker, day) for ticker in ("A", "B") for day in (MONDAY, TUESDAY, WEDNESDAY)]
+    found = store.get_many(complete + [key("A", THURSDAY), key("B", THURSDAY)])
+    assert sorted(found) == sorted(complete)
+    assert found[key("A", TUESDAY)].empty
+    assert found[key("B", MONDAY)].empty
+    assert len(found[key("B", WEDNESDAY)]) == 1
+
+    # After a restart the complete days come from disk alone
+    data.get_result_cache().clear()
+    fetches.clear()
+    df = data.get_stock_min(["A", "B"], local(MONDAY), local(WEDNESDAY), "Day")
+    assert fetches == []
+    assert len(df) == 3
@@ -0,0 +1,285 @@
+import bisect
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import plotly.graph_objs as go
+import streamlit as st
+
+# Upper bounds (seconds) of the span duration histogram buckets exported for Prometheus
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The metrics file is rewritten at most this often (seconds)
+METRICS_INTERVAL = 15
+
+_local = threading.local()
+
+
+# The spans of one script or fragment run. Spans started on other threads while the run waits for them (the query
+# pools) are added through the context captured when the work was submitted.
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.id = uuid.uuid4().hex[:12]
+        self.time = datetime.datetime.now()
+        self.started = time.perf_counter()
+        self.ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+            return len(self.spans) - 1
+
+    def to_dict(self):
+        return {
+            "trace": self.id,
+            "name": self.name,
+            "time": self.time.isoformat(timespec="milliseconds"),
+            "ms": self.ms,
+            "spans": self.spans,
+        }
+
+
+# Span durations of the whole process: cumulative Prometheus histograms plus the most recent `window` durations of
+# each span for the Diagnostics page, and the most recent finished traces
+class Tracer:
+    def __init__(self, window=1000, traces=200, log_path=None, metrics_path=None):
+        self.window = window
+        self.log_path = log_path
+        self.metrics_path = metrics_path
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._recent = {}
+        self._histograms = {}
+        self._traces = deque(maxlen=traces)
+        self._exported = 0
+
+    def record(self, name, ms):
+        with self._lock:
+            if name not in self._recent:
+                self._recent[name] = deque(maxlen=self.window)
+                self._histograms[name] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+            self._recent[name].append(ms)
+            histogram = self._histograms[name]
+            histogram["buckets"][bisect.bisect_left(BUCKETS, ms / 1000)] += 1
+            histogram["sum"] += ms / 1000
+            histogram["count"] += 1
+
+    def finish(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+            export = self.metrics_path and time.monotonic() - self._exported >= METRICS_INTERVAL
+            if export:
+                self._exported = time.monotonic()
+        with self._file_lock:
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+            if export:
+                tmp = f"{self.metrics_path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    f.write(self.prometheus())
+                os.replace(tmp, self.metrics_path)
+
+    def traces(self):
+        with self._lock:
+            return list(self._traces)
+
+    # [{"span", "count", "p50_ms", "p90_ms", "p99_ms", "max_ms"}] over each span's recent durations
+    def percentiles(self):
+        with self._lock:
+            recent = {name: np.array(durations) for name, durations in self._recent.items()}
+        rows = []
+        for name, durations in sorted(recent.items()):
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+            rows.append(
+                {"span": name, "count": len(durations), "p50_ms": p50, "p90_ms": p90, "p99_ms": p99, "max_ms": durations.max()}
+            )
+        return rows
+
+    # The histograms in the Prometheus text exposition format
+    def prometheus(self):
+        with self._lock:
+            histograms = {name: dict(h, buckets=list(h["buckets"])) for name, h in self._histograms.items()}
+        lines = [
+            "# HELP app_span_duration_seconds Duration of traced spans.",
+            "# TYPE app_span_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(histograms.items()):
+            cumulative = np.cumsum(histogram["buckets"])
+            for bound, count in zip(BUCKETS, cumulative):
+                lines.append(f'app_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'app_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'app_span_duration_seconds_sum{{span="{name}"}} {histogram["sum"]}')
+            lines.append(f'app_span_duration_seconds_count{{span="{name}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._histograms.clear()
+            self._traces.clear()
+
+
+def _path(variable, secret):
+    try:
+        return os.environ.get(variable) or st.secrets.get(secret)
+    except FileNotFoundError:
+        return os.environ.get(variable)
+
+
+# Finished traces are appended as JSON lines to TRACE_LOG (trace_log in secrets), and the histograms are written to
+# TRACE_METRICS (trace_metrics) for a Prometheus textfile collector; both are off unless configured
+@st.cache_resource
+def get_tracer():
+    print("get_tracer()")
+    return Tracer(log_path=_path("TRACE_LOG", "trace_log"), metrics_path=_path("TRACE_METRICS", "trace_metrics"))
+
+
+def _stack():
+    if getattr(_local, "stack", None) is None:
+        _local.stack = []
+    return _local.stack
+
+
+# Time a block as a span of the current thread's trace (if any) and in the process histograms. Yields the span's
+# record so attributes can be added to it.
+@contextmanager
+def span(name, **attrs):
+    trace = getattr(_local, "trace", None)
+    stack = _stack()
+    started = time.perf_counter()
+    record = dict(attrs)
+    if trace is not None:
+        record.update(
+            name=name,
+            parent=stack[-1] if stack else None,
+            start_ms=(started - trace.started) * 1000,
+            thread=threading.current_thread().name,
+        )
+        stack.append(trace.add(record))
+    try:
+        yield record
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        if trace is not None:
+            stack.pop()
+            record["ms"] = ms
+        get_tracer().record(name, ms)
+
+
+# Decorator form of span(), named module.function unless a name is given
+def traced(name=None):
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# Start tracing a script or fragment run on this thread; any trace left unfinished by an earlier run (stopped by
+# st.stop or st.rerun) is dropped
+def begin(name):
+    _local.trace = Trace(name)
+    _local.stack = []
+    return _local.trace
+
+
+# Finish the thread's trace and hand it to the tracer. With `show`, the run's timeline is drawn at this point of the
+# page when the debug overlay is on (?trace=1 in the URL).
+def end(show=True):
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return None
+    _local.trace = None
+    _local.stack = []
+    trace.ms = (time.perf_counter() - trace.started) * 1000
+    get_tracer().finish(trace)
+    if show and overlay_enabled():
+        with st.expander(f"Trace {trace.name}: {trace.ms:.0f} ms", expanded=True):
+            st.plotly_chart(render_timeline(trace))
+    return trace
+
+
+def overlay_enabled():
+    return st.query_params.get("trace") == "1"
+
+
+# Trace a fragment: a span of the page's trace when the fragment runs as part of the page run, a trace of its own
+# when it reruns by itself
+@contextmanager
+def fragment_run(name):
+    if getattr(_local, "trace", None) is not None:
+        with span(name):
+            yield
+        return
+    begin(name)
+    try:
+        yield
+    finally:
+        end(show=False)
+
+
+# The current thread's trace and span, to continue it on another thread with attached()
+def context():
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return None
+    stack = _stack()
+    return trace, stack[-1] if stack else None
+
+
+@contextmanager
+def attached(ctx):
+    previous = getattr(_local, "trace", None), getattr(_local, "stack", None)
+    if ctx is not None:
+        _local.trace = ctx[0]
+        _local.stack = [ctx[1]] if ctx[1] is not None else []
+    else:
+        _local.trace = None
+        _local.stack = []
+    try:
+        yield
+    finally:
+        _local.trace, _local.stack = previous
+
+
+# Spans of a trace as horizontal bars on a shared time axis, nested spans indented under their parents
+def render_timeline(trace):
+    depths = {}
+    for index, record in enumerate(trace.spans):
+        parent = record.get("parent")
+        depths[index] = 0 if parent is None else depths.get(parent, 0) + 1
+    spans = [(index, record) for index, record in enumerate(trace.spans) if record.get("ms") is not None]
+    labels = [f"{'  ' * depths[index]}{record['name']} [{record['thread']}]" for index, record in spans]
+    fig = go.Figure(
+        go.Bar(
+            y=list(range(len(spans))),
+            x=[record["ms"] for _, record in spans],
+            base=[record["start_ms"] for _, record in spans],
+            orientation="h",
+            customdata=labels,
+            hovertemplate="%{customdata}<br>%{base:.1f} ms + %{x:.1f} ms<extra></extra>",
+        )
+    )
+    fig.update_yaxes(
+        autorange="reversed", tickmode="array", tickvals=list(range(len(spans))), ticktext=labels, tickfont=dict(family="monospace")
+    )
+    fig.update_xaxes(title_text="ms since the start of the run")
+    fig.update_layout(showlegend=False, margin=dict(l=0, r=20, t=20, b=20), height=max(200, 18 * len(spans) + 60))
+    return fig
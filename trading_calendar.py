@@ -0,0 +1,176 @@
+import bisect
+import datetime
+from collections import namedtuple
+from functools import lru_cache
+
+import pytz
+
+nytz = pytz.timezone("America/New_York")
+
+PRE_OPEN = datetime.time(4, 0)
+OPEN = datetime.time(9, 30)
+CLOSE = datetime.time(16, 0)
+EARLY_CLOSE = datetime.time(13, 0)
+POST_CLOSE = datetime.time(20, 0)
+EARLY_POST_CLOSE = datetime.time(17, 0)
+
+# Unscheduled full-day closures that do not follow from the holiday rules
+SPECIAL_CLOSURES = {
+    datetime.date(2018, 12, 5): "National Day of Mourning for George H.W. Bush",
+    datetime.date(2025, 1, 9): "National Day of Mourning for Jimmy Carter",
+}
+
+# Bounds of one trading session as timezone-aware New York datetimes
+Session = namedtuple("Session", ["pre_open", "open", "close", "post_close"])
+
+
+def _nth_weekday(year, month, weekday, n):
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _last_weekday(year, month, weekday):
+    last = datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+# Anonymous Gregorian algorithm
+def _easter(year):
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+# Holidays falling on Saturday are observed the Friday before, on Sunday the Monday after
+def _observed(day):
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+# NYSE full-day holidays for a year: {date: name}
+@lru_cache(maxsize=None)
+def holidays(year):
+    days = {}
+    new_year = datetime.date(year, 1, 1)
+    # New Year's Day on a Saturday is not observed on the preceding Friday
+    if new_year.weekday() != 5:
+        days[_observed(new_year)] = "New Year's Day"
+    if year >= 1998:
+        days[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    days[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    days[_easter(year) - datetime.timedelta(days=2)] = "Good Friday"
+    days[_last_weekday(year, 5, 0)] = "Memorial Day"
+    if year >= 2022:
+        days[_observed(datetime.date(year, 6, 19))] = "Juneteenth"
+    days[_observed(datetime.date(year, 7, 4))] = "Independence Day"
+    days[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    days[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    days[_observed(datetime.date(year, 12, 25))] = "Christmas Day"
+    for day, name in SPECIAL_CLOSURES.items():
+        if day.year == year:
+            days[day] = name
+    return days
+
+
+# Days with a 1:00 p.m. close: July 3rd and Christmas Eve when they fall Monday to Thursday, and the day after
+# Thanksgiving
+@lru_cache(maxsize=None)
+def early_closes(year):
+    days = {_nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1)}
+    for day in (datetime.date(year, 7, 3), datetime.date(year, 12, 24)):
+        if day.weekday() < 4:
+            days.add(day)
+    return frozenset(days - set(holidays(year)))
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+# Sorted trading days of a year
+@lru_cache(maxsize=None)
+def _trading_days(year):
+    day = datetime.date(year, 1, 1)
+    days = []
+    while day.year == year:
+        if is_trading_day(day):
+            days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+# Every calendar day of a year mapped to the last trading day strictly before it
+@lru_cache(maxsize=None)
+def _previous_index(year):
+    index = {}
+    previous = _trading_days(year - 1)[-1]
+    day = datetime.date(year, 1, 1)
+    while day.year == year:
+        index[day] = previous
+        if is_trading_day(day):
+            previous = day
+        day += datetime.timedelta(days=1)
+    return index
+
+
+def previous_trading_day(day):
+    return _previous_index(day.year)[day]
+
+
+def next_trading_day(day):
+    days = _trading_days(day.year)
+    i = bisect.bisect_right(days, day)
+    return days[i] if i < len(days) else _trading_days(day.year + 1)[0]
+
+
+# Trading days in an inclusive range
+def trading_days(start, end):
+    days = []
+    for year in range(start.year, end.year + 1):
+        days.extend(day for day in _trading_days(year) if start <= day <= end)
+    return days
+
+
+def session(day):
+    if not is_trading_day(day):
+        return None
+    early = day in early_closes(day.year)
+    return Session(
+        nytz.localize(datetime.datetime.combine(day, PRE_OPEN)),
+        nytz.localize(datetime.datetime.combine(day, OPEN)),
+        nytz.localize(datetime.datetime.combine(day, EARLY_CLOSE if early else CLOSE)),
+        nytz.localize(datetime.datetime.combine(day, EARLY_POST_CLOSE if early else POST_CLOSE)),
+    )
+
+
+# Which part of the trading day `now` falls in: "closed", "pre", "regular" or "post"
+def market_phase(now=None):
+    now = datetime.datetime.now(nytz) if now is None else now.astimezone(nytz)
+    bounds = session(now.date())
+    if bounds is None or now < bounds.pre_open or now >= bounds.post_close:
+        return "closed"
+    if now < bounds.open:
+        return "pre"
+    if now < bounds.close:
+        return "regular"
+    return "post"
+
+
+# When the next pre-market session starts, from `now` (it may be later today)
+def next_pre_open(now=None):
+    now = datetime.datetime.now(nytz) if now is None else now.astimezone(nytz)
+    bounds = session(now.date())
+    if bounds is None or now >= bounds.pre_open:
+        bounds = session(next_trading_day(now.date()))
+    return bounds.pre_open